@@ -0,0 +1,161 @@
+import random
+
+sources = ['SPOTIFY', 'DEEZER', 'LOCAL', 'CSV']
+
+syllables = ['ka', 'lo', 'mi', 'ne', 'ra', 'so', 'tu', 'vi', 'ze', 'an', 'el', 'or', 'us', 'dy', 'fa', 'go', 'hi', 'ju']
+
+title_suffixes = [' (Remastered)', ' - Radio Edit', ' (Live)', ' feat. Guest', '!']
+
+artist_separators = [';', ',', ', ']
+
+
+class Song:
+    """One recording. Tracks of the library are copies of songs in different sources."""
+    artists: list
+    title: str
+    album: str
+    isrc: str
+    length: int
+    year: str
+    track_number: int
+
+    def __init__(self, rnd: random.Random, artists_pool: list, albums_pool: list, number: int):
+        artists_count = 1 if rnd.random() < 0.8 else rnd.randint(2, 3)
+        self.artists = rnd.sample(artists_pool, artists_count)
+        self.title = make_words(rnd, rnd.randint(1, 4))
+        self.album = rnd.choice(albums_pool)
+        self.isrc = f'{rnd.choice(["US", "GB", "DE", "RU"])}{rnd.randint(100, 999)}{number:08d}'
+        self.length = rnd.randint(90, 480)
+        self.year = str(rnd.randint(1960, 2022))
+        self.track_number = rnd.randint(1, 16)
+
+
+def make_words(rnd: random.Random, count: int):
+    words = []
+    for i in range(count):
+        word = ''.join(rnd.choice(syllables) for s in range(rnd.randint(1, 3)))
+        words.append(word.capitalize())
+    return ' '.join(words)
+
+
+def make_id(rnd: random.Random):
+    return f'{rnd.getrandbits(88):022x}'
+
+
+def change_title(rnd: random.Random, title: str):
+    # the same song can be titled differently in other sources, compare_tags matches them by prefix
+    r = rnd.random()
+    if r < 0.2:
+        return title + rnd.choice(title_suffixes)
+    if r < 0.3:
+        return title.upper()
+    if r < 0.4:
+        return title.lower()
+    return title
+
+
+def make_track(rnd: random.Random, song: Song, source: str, number: int, is_duplicate: bool,
+               length_jitter: int):
+    tags = {}
+
+    length = song.length
+    title = song.title
+    if is_duplicate:
+        length += rnd.randint(-length_jitter, length_jitter)
+        title = change_title(rnd, title)
+    separator = rnd.choice(artist_separators)
+
+    if source == 'SPOTIFY':
+        tags['SPOTY_SOURCE'] = 'SPOTIFY'
+        tags['SPOTY_PLAYLIST_ID'] = f'playlist{number % 50}'
+        tags['SPOTY_PLAYLIST_NAME'] = f'Spotify playlist {number % 50}'
+        tags['SPOTY_PLAYLIST_INDEX'] = str(number)
+        if rnd.random() < 0.95:
+            tags['ISRC'] = song.isrc
+        tags['ARTIST'] = ';'.join(song.artists)
+        tags['TITLE'] = title
+        tags['ALBUM'] = song.album
+        tags['SPOTY_LENGTH'] = str(length)
+        tags['SPOTIFY_ALBUM_ID'] = make_id(rnd)
+        tags['SPOTIFY_TRACK_ID'] = make_id(rnd)
+        tags['EXPLICIT'] = rnd.random() < 0.1
+        tags['TRACK'] = song.track_number
+        tags['YEAR'] = song.year
+
+    elif source == 'DEEZER':
+        tags['SPOTY_SOURCE'] = 'DEEZER'
+        tags['SPOTY_PLAYLIST_ID'] = str(1000 + number % 50)
+        tags['SPOTY_PLAYLIST_NAME'] = f'Deezer playlist {number % 50}'
+        tags['SPOTY_PLAYLIST_INDEX'] = str(number)
+        if rnd.random() < 0.9:
+            tags['ISRC'] = song.isrc
+        tags['ARTIST'] = song.artists[0]
+        tags['TITLE'] = title
+        tags['SPOTY_LENGTH'] = length
+        tags['DEEZER_ALBUM_ID'] = str(rnd.randint(100000, 999999))
+        tags['DEEZER_TRACK_ID'] = str(rnd.randint(1000000, 99999999))
+        tags['DEEZER_ARTIST_ID'] = str(rnd.randint(1000, 99999))
+        tags['EXPLICIT'] = rnd.random() < 0.1
+        tags['GAIN'] = str(round(rnd.uniform(-12, 0), 1))
+
+    elif source == 'LOCAL':
+        artist = separator.join(song.artists)
+        file_name = f'/music/{song.artists[0]}/{song.album}/{song.track_number:02d} {artist} - {title} {number}.flac'
+        tags['SPOTY_FILE_NAME'] = file_name
+        tags['SPOTY_SOURCE'] = 'LOCAL'
+        tags['SPOTY_PLAYLIST_NAME'] = song.album
+        tags['SPOTY_TRACK_ADDED'] = f'{song.year}-01-01 00:00:00'
+        tags['SPOTY_LENGTH'] = str(length)
+        if rnd.random() < 0.7:
+            tags['ISRC'] = song.isrc if rnd.random() < 0.5 else \
+                f'{song.isrc[:2]}-{song.isrc[2:5]}-{song.isrc[5:7]}-{song.isrc[7:]}'
+        if rnd.random() < 0.95:
+            tags['ARTIST'] = artist
+        if rnd.random() < 0.95:
+            tags['TITLE'] = title
+        if rnd.random() < 0.9:
+            tags['ALBUM'] = song.album
+        tags['DATE'] = song.year
+        tags['TRACKNUMBER'] = str(song.track_number)
+
+    elif source == 'CSV':
+        tags['SPOTY_SOURCE'] = 'CSV'
+        tags['SPOTY_PLAYLIST_ID'] = f'csv{number % 20}'
+        tags['SPOTY_PLAYLIST_NAME'] = f'CSV playlist {number % 20}'
+        tags['SPOTY_PLAYLIST_INDEX'] = str(number)
+        tags['ARTIST'] = separator.join(song.artists)
+        tags['TITLE'] = title
+        if rnd.random() < 0.5:
+            tags['ALBUM'] = song.album
+        if rnd.random() < 0.6:
+            tags['ISRC'] = song.isrc
+        if rnd.random() < 0.8:
+            tags['SPOTY_LENGTH'] = str(length)
+
+    return tags
+
+
+def generate_library(count: int, seed=1, duplicates_rate=0.2, length_jitter=2, source_list: list = None):
+    """Returns a list of tags of count tracks. The same seed gives the same library."""
+    if source_list is None:
+        source_list = sources
+
+    rnd = random.Random(seed)
+
+    # a few artists and albums are shared by many songs, like in a real library
+    artists_pool = [make_words(rnd, rnd.randint(1, 2)) for i in range(max(10, count // 20))]
+    albums_pool = [make_words(rnd, rnd.randint(1, 3)) for i in range(max(10, count // 10))]
+
+    songs = []
+    tags_list = []
+    for i in range(count):
+        is_duplicate = len(songs) > 0 and rnd.random() < duplicates_rate
+        if is_duplicate:
+            song = rnd.choice(songs)
+        else:
+            song = Song(rnd, artists_pool, albums_pool, len(songs))
+            songs.append(song)
+        source = rnd.choice(source_list)
+        tags_list.append(make_track(rnd, song, source, i, is_duplicate, length_jitter))
+
+    return tags_list
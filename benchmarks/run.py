@@ -0,0 +1,270 @@
+from benchmarks.generator import generate_library, sources
+from spoty import settings
+import spoty.utils
+import spoty.tags_index
+from spoty.track import Track
+import tracemalloc
+import click
+import json
+import time
+import os
+
+default_baseline_file_name = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'baseline.json')
+
+original_compare_tags = spoty.utils.compare_tags
+compare_tags_calls = 0
+
+
+def counting_compare_tags(*args, **kwargs):
+    global compare_tags_calls
+    compare_tags_calls += 1
+    return original_compare_tags(*args, **kwargs)
+
+
+def get_compare_tags_lists():
+    return list(settings.SPOTY.COMPARE_TAGS_DEFINITELY_DUPLICATE), list(settings.SPOTY.COMPARE_TAGS_PROBABLY_DUPLICATE)
+
+
+def bench_compare_tags(tags_list: list, jobs: int):
+    def_list, prob_list = get_compare_tags_lists()
+    cache = spoty.tags_index.NormalizedTagsCache()
+    count = len(tags_list)
+    for tags in def_list + prob_list:
+        tags_to_compare = tags.split(',')
+        for i in range(count):
+            spoty.utils.compare_tags(tags_list[i], tags_list[(i * 31 + 7) % count], tags_to_compare, False, cache)
+    return count
+
+
+def bench_find_duplicates_in_tag_list2(tags_list: list, jobs: int):
+    def_list, prob_list = get_compare_tags_lists()
+    spoty.utils.find_duplicates_in_tag_list2(tags_list, def_list, prob_list, False, jobs)
+    return len(tags_list)
+
+
+def bench_find_duplicates_similar(tags_list: list, jobs: int):
+    def_list, prob_list = get_compare_tags_lists()
+    spoty.utils.find_duplicates_in_tag_list2(tags_list, def_list, prob_list, False, jobs,
+                                             float(settings.SPOTY.SIMILARITY_THRESHOLD))
+    return len(tags_list)
+
+
+def bench_find_duplicates_in_tag_lists(tags_list: list, jobs: int):
+    def_list, prob_list = get_compare_tags_lists()
+    half = len(tags_list) // 2
+    spoty.utils.find_duplicates_in_tag_lists(tags_list[:half], tags_list[half:], def_list, prob_list, False, True, jobs)
+    return len(tags_list)
+
+
+def bench_group_tags_by_pattern(tags_list: list, jobs: int):
+    spoty.utils.group_tags_by_pattern(tags_list, settings.SPOTY.DEFAULT_EXPORT_GROUPING_PATTERN)
+    return len(tags_list)
+
+
+def bench_parse_pattern(tags_list: list, jobs: int):
+    for tags in tags_list:
+        spoty.utils.parse_pattern(tags, settings.SPOTY.DEFAULT_PRINT_PATTERN)
+    return len(tags_list)
+
+
+benchmarks = {
+    'compare_tags': bench_compare_tags,
+    'find_duplicates_in_tag_list2': bench_find_duplicates_in_tag_list2,
+    'find_duplicates_similar': bench_find_duplicates_similar,
+    'find_duplicates_in_tag_lists': bench_find_duplicates_in_tag_lists,
+    'group_tags_by_pattern': bench_group_tags_by_pattern,
+    'parse_pattern': bench_parse_pattern,
+}
+
+
+class BenchmarkResult:
+    name: str
+    size: int
+    seconds: float
+    peak_memory: int
+    comparisons: int
+    tracks: int
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.seconds = 0
+        self.peak_memory = None
+        self.comparisons = 0
+        self.tracks = 0
+
+    def to_dict(self):
+        return {
+            'seconds': round(self.seconds, 4),
+            'peak_memory': self.peak_memory,
+            'comparisons': self.comparisons,
+        }
+
+
+def make_library(size: int, seed: int, duplicates_rate: float, length_jitter: int, source_list: list,
+                 use_tracks: bool):
+    tags_list = generate_library(size, seed, duplicates_rate, length_jitter, source_list)
+    if use_tracks:
+        tags_list = [Track(tags) for tags in tags_list]
+    return tags_list
+
+
+def run_benchmark(name: str, size: int, seed: int, duplicates_rate: float, length_jitter: int, source_list: list,
+                  jobs: int, measure_memory: bool, use_tracks: bool):
+    global compare_tags_calls
+
+    result = BenchmarkResult(name, size)
+    bench_func = benchmarks[name]
+
+    # tracks are changed by some functions, so every run gets a new library
+
+    tags_list = make_library(size, seed, duplicates_rate, length_jitter, source_list, use_tracks)
+    compare_tags_calls = 0
+    spoty.utils.compare_tags = counting_compare_tags
+    try:
+        start = time.perf_counter()
+        result.tracks = bench_func(tags_list, jobs)
+        result.seconds = time.perf_counter() - start
+    finally:
+        spoty.utils.compare_tags = original_compare_tags
+    result.comparisons = compare_tags_calls
+
+    # memory is measured by a separate run, because tracing slows down everything
+
+    if measure_memory:
+        tags_list = make_library(size, seed, duplicates_rate, length_jitter, source_list, use_tracks)
+        tracemalloc.start()
+        try:
+            bench_func(tags_list, jobs)
+            result.peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def read_baseline(file_name: str):
+    if not os.path.isfile(file_name):
+        return {}
+    with open(file_name, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def get_library_params(seed: int, duplicates_rate: float, length_jitter: int, source_list: list):
+    return {
+        'seed': seed,
+        'duplicates_rate': duplicates_rate,
+        'length_jitter': length_jitter,
+        'sources': source_list if source_list is not None else sources,
+    }
+
+
+def write_baseline(file_name: str, results: list, library_params: dict):
+    baseline = read_baseline(file_name)
+    if baseline.get('library') != library_params:
+        baseline = {}
+    baseline['library'] = library_params
+    benchmarks_results = baseline.setdefault('results', {})
+    for result in results:
+        benchmarks_results.setdefault(result.name, {})[str(result.size)] = result.to_dict()
+    with open(file_name, 'w', encoding='utf-8') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def check_regressions(baseline: dict, results: list, tolerance: float):
+    # comparisons count doesn't depend on the machine, time and memory are compared with tolerance
+    regressions = []
+    for result in results:
+        base = baseline.get('results', {}).get(result.name, {}).get(str(result.size))
+        if base is None:
+            continue
+        if result.comparisons > base['comparisons']:
+            regressions.append(f'{result.name} {result.size}: {result.comparisons} comparisons, '
+                               f'baseline {base["comparisons"]}')
+        if result.seconds > base['seconds'] * (1 + tolerance):
+            regressions.append(f'{result.name} {result.size}: {result.seconds:.3f} sec, '
+                               f'baseline {base["seconds"]:.3f} sec')
+        if result.peak_memory is not None and base['peak_memory'] is not None \
+                and result.peak_memory > base['peak_memory'] * (1 + tolerance):
+            regressions.append(f'{result.name} {result.size}: {format_memory(result.peak_memory)} peak memory, '
+                               f'baseline {format_memory(base["peak_memory"])}')
+    return regressions
+
+
+def format_memory(size: int):
+    if size is None:
+        return '-'
+    return f'{size / 1024 / 1024:.1f} MB'
+
+
+def print_result(result: BenchmarkResult):
+    per_second = result.comparisons if result.comparisons > 0 else result.tracks
+    per_second = per_second / result.seconds if result.seconds > 0 else 0
+    unit = 'comparisons' if result.comparisons > 0 else 'tracks'
+    click.echo(f'{result.name:<30} {result.size:>8} tracks {result.seconds:>10.3f} sec '
+               f'{format_memory(result.peak_memory):>10} {per_second:>14,.0f} {unit}/sec')
+
+
+@click.command()
+@click.option('--bench', '-b', multiple=True, type=click.Choice(list(benchmarks.keys())),
+              help='Benchmark to run. Can be specified multiple times. All benchmarks are run by default.')
+@click.option('--size', '-s', multiple=True, type=int, default=[1000, 10000], show_default=True,
+              help='Number of tracks in the generated library. Can be specified multiple times (1000, 10000, 100000, 1000000).')
+@click.option('--seed', type=int, default=1, show_default=True,
+              help='Seed of the library generator. The same seed gives the same library.')
+@click.option('--duplicates-rate', '--dr', type=float, default=0.2, show_default=True,
+              help='Part of tracks which are copies of other tracks.')
+@click.option('--length-jitter', '--lj', type=int, default=2, show_default=True,
+              help='Max difference of length (in seconds) between duplicates.')
+@click.option('--source', multiple=True, type=click.Choice(sources),
+              help='Generate tracks of this source. Can be specified multiple times. All sources are used by default.')
+@click.option('--jobs', '-j', type=int, default=1, show_default=True,
+              help='Number of worker processes. Comparisons in worker processes are not counted.')
+@click.option('--tracks', 'use_tracks', is_flag=True,
+              help='Store generated tags in Track records instead of dicts.')
+@click.option('--no-memory', is_flag=True,
+              help='Do not measure peak memory. Each benchmark will be run once instead of twice.')
+@click.option('--baseline', 'baseline_file_name', default=default_baseline_file_name,
+              help='Baseline file name.')
+@click.option('--save-baseline', is_flag=True,
+              help='Save results to the baseline file.')
+@click.option('--check', is_flag=True,
+              help='Compare results with the baseline file and exit with error code if there are regressions.')
+@click.option('--tolerance', type=float, default=0.5, show_default=True,
+              help='Allowed increase of time and memory compared to the baseline (0.5 - 50%).')
+def cli(bench, size, seed, duplicates_rate, length_jitter, source, jobs, use_tracks, no_memory, baseline_file_name,
+        save_baseline, check, tolerance):
+    """
+Run benchmarks of the tags matching functions on generated libraries.
+    """
+    if len(bench) == 0:
+        bench = list(benchmarks.keys())
+    source_list = list(source) if len(source) > 0 else None
+
+    library_params = get_library_params(seed, duplicates_rate, length_jitter, source_list)
+
+    results = []
+    for s in size:
+        for name in bench:
+            result = run_benchmark(name, s, seed, duplicates_rate, length_jitter, source_list, jobs, not no_memory,
+                                   use_tracks)
+            print_result(result)
+            results.append(result)
+
+    if save_baseline:
+        write_baseline(baseline_file_name, results, library_params)
+        click.echo(f'Baseline saved: {baseline_file_name}')
+
+    if check:
+        baseline = read_baseline(baseline_file_name)
+        if baseline.get('library') != library_params:
+            click.echo(f'Baseline was recorded with another library: {baseline_file_name}')
+            exit(1)
+        regressions = check_regressions(baseline, results, tolerance)
+        if len(regressions) > 0:
+            click.echo(f'\n{len(regressions)} regressions found:')
+            for regression in regressions:
+                click.echo('  ' + regression)
+            exit(1)
+        click.echo('\nNo regressions found.')
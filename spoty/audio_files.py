@@ -1,5 +1,7 @@
 from spoty import log
 import spoty.utils
+import spoty.string_pool
+import spoty.track
 import os.path
 import click
 import time, datetime
@@ -8,6 +10,9 @@ from mutagen.mp3 import MP3
 from mutagen.easyid3 import EasyID3
 from mutagen.id3 import ID3, TXXX, TMOO
 
+STREAM_BATCH_SIZE = 100  # audio files read before their tags are passed to the next commands (see get --stream)
+PARALLEL_MIN_FILES = 500  # less files are read in one process, starting of worker processes takes longer
+
 
 def is_flac(file_name):
     return file_name.upper().endswith('.FLAC')
@@ -75,18 +80,45 @@ def write_audio_file_tags(file_name, new_tags):
                 f.save(v2_version=3)
 
 
-def read_audio_files_tags(file_names, add_spoty_tags=True, clean_tags=True):
+def read_audio_files_tags(file_names, add_spoty_tags=True, clean_tags=True, required_tags: set = None,
+                          jobs: int = None):
+    # tags are parsed in worker processes if there are many files (see run_tasks)
+    data = (file_names, add_spoty_tags, clean_tags, required_tags)
+    with click.progressbar(length=len(file_names), label=f'Reading tags in {len(file_names)} files') as bar:
+        results = spoty.utils.run_tasks(read_audio_files_tags_task, data, len(file_names), jobs, bar,
+                                        PARALLEL_MIN_FILES)
+
+    # values read by worker processes are different strings, so they are pooled again
+    return [spoty.string_pool.pool_tags(tags) for tags_list in results for tags in tags_list]
+
+
+def read_audio_files_tags_task(data, positions):
+    file_names, add_spoty_tags, clean_tags, required_tags = data
     tags_list = []
-    with click.progressbar(file_names, label=f'Reading tags in {len(file_names)} files') as bar:
-        for file_name in bar:
-            tags = read_audio_file_tags(file_name, add_spoty_tags, clean_tags)
-            if tags is not None:
-                tags_list.append(tags)
+    for i in positions:
+        tags = read_audio_file_tags(file_names[i], add_spoty_tags, clean_tags, required_tags)
+        if tags is not None:
+            tags_list.append(tags)
     return tags_list
 
 
-def read_audio_file_tags(file_name, add_spoty_tags=True, clean_tags=True):
-    tags = {}
+def iterate_audio_files_tags(file_names, add_spoty_tags=True, clean_tags=True, required_tags: set = None,
+                             batch_size=STREAM_BATCH_SIZE):
+    # tags are yielded in parts as soon as batch_size files are read
+    tags_list = []
+    for file_name in file_names:
+        tags = read_audio_file_tags(file_name, add_spoty_tags, clean_tags, required_tags)
+        if tags is not None:
+            tags_list.append(tags)
+        if len(tags_list) >= batch_size:
+            yield tags_list
+            tags_list = []
+    if len(tags_list) > 0:
+        yield tags_list
+
+
+def read_audio_file_tags(file_name, add_spoty_tags=True, clean_tags=True, required_tags: set = None):
+    tags = spoty.track.new_tags()
 
     file_name = os.path.abspath(file_name)
 
@@ -107,10 +139,13 @@ def read_audio_file_tags(file_name, add_spoty_tags=True, clean_tags=True):
             f = FLAC(file_name)
             tags['SPOTY_LENGTH'] = str(int(f.info.length))
             for tag in f.tags:
-                if tag[0] in tags:  # adding same key with one more value
-                    tags[tag[0]] += ';' + tag[1]
+                key = spoty.string_pool.get_key(tag[0])
+                if required_tags is not None and key not in required_tags:
+                    continue
+                if key in tags:  # adding same key with one more value
+                    tags[key] += ';' + tag[1]
                 else:
-                    tags[tag[0]] = tag[1]
+                    tags[key] = tag[1]
         except:
             click.echo(f"\nCant open file: {file_name}")
             return None
@@ -123,11 +158,15 @@ def read_audio_file_tags(file_name, add_spoty_tags=True, clean_tags=True):
             keys = f.keys()
             for tag in f.valid_keys.keys():
                 if tag in f:
-                    tag_val = ';'.join(f[tag])
-                    tags[tag.upper()] = tag_val
+                    key = spoty.string_pool.get_key(tag.upper())
+                    if required_tags is not None and key not in required_tags:
+                        continue
+                    tags[key] = ';'.join(f[tag])
             f = ID3(file_name)
             for txxx in f.getall("TXXX"):  # custom keys
-                tag = txxx.desc.upper()
+                tag = spoty.string_pool.get_key(txxx.desc.upper())
+                if required_tags is not None and tag not in required_tags:
+                    continue
                 val = ';'.join(txxx.text)
                 tags[tag] = val
         except:
@@ -137,4 +176,6 @@ def read_audio_file_tags(file_name, add_spoty_tags=True, clean_tags=True):
     if clean_tags:
         tags = spoty.utils.clean_tags_after_read(tags)
 
+    spoty.string_pool.pool_tags(tags)
+
     return tags
@@ -31,6 +31,10 @@ Export a list of duplicates to csv file.
     date_time_str = datetime.now().strftime("%Y_%m_%d-%H_%M_%S")
     file_name = 'duplicates-' + date_time_str
 
+    if context.duplicates_groups_stream is not None:
+        export_duplicates_stream(context, path, file_name, no_source, no_split_groups)
+        return
+
     duplicates_count = 0
 
     all_tags_list = []
@@ -54,3 +58,47 @@ Export a list of duplicates to csv file.
         context.summary.append(f'  No tracks to export.')
     click.echo('\n------------------------------------------------------------')
     click.echo('\n'.join(context.summary))
+
+
+def export_duplicates_stream(context: SpotyContext, path, file_name, no_source, no_split_groups):
+    # each group is written to the file as soon as it is found
+
+    csv_file_name = os.path.join(path, spoty.utils.slugify_file_pah(file_name) + '.csv')
+    if os.path.isfile(csv_file_name):
+        csv_file_name = spoty.utils.find_empty_file_name(csv_file_name)
+
+    keys = []
+    for tags in context.tags_lists[0]:
+        for key in tags.keys():
+            if key not in keys:
+                keys.append(key)
+    for key in ['SPOTY_DUP_GROUP', 'SPOTY_DEF_DUP_TAGS', 'SPOTY_PROB_DUP_TAGS']:
+        if key not in keys:
+            keys.append(key)
+
+    duplicates_count = 0
+
+    def iterate_tags():
+        nonlocal duplicates_count
+        for group in context.duplicates_groups_stream:
+            if not no_source:
+                yield group.source_tags
+            yield from group.def_duplicates
+            yield from group.prob_duplicates
+            duplicates_count += len(group.def_duplicates)
+            duplicates_count += len(group.prob_duplicates)
+            if not no_split_groups:
+                yield {}
+
+    tracks_count = spoty.csv_playlist.write_tags_to_csv_incrementally(iterate_tags(), csv_file_name, keys)
+    if tracks_count == 0:
+        os.remove(csv_file_name)
+
+    context.summary.append("Exporting:")
+    if tracks_count > 0:
+        context.summary.append(
+            f'  {duplicates_count} duplicates exported to csv file ("{csv_file_name}").')
+    else:
+        context.summary.append(f'  No tracks to export.')
+    click.echo('\n------------------------------------------------------------')
+    click.echo('\n'.join(context.summary))
@@ -52,6 +52,9 @@ Get duplicates for further actions (see next commands).
     context.unique_first_tracks = []
     context.unique_second_tracks = []
 
+
+get_duplicates.get_required_tags = lambda params: []
+
 get_duplicates.add_command(count_command.count_tracks)
 get_duplicates.add_command(print_command.print_tracks)
 get_duplicates.add_command(export_command.export_tracks)
@@ -35,6 +35,9 @@ Get unique tracks (not duplicated) for further actions (see next commands).
     context.unique_first_tracks = []
     context.unique_second_tracks = []
 
+
+get_unique.get_required_tags = lambda params: []
+
 get_unique.add_command(count_command.count_tracks)
 get_unique.add_command(print_command.print_tracks)
 get_unique.add_command(export_command.export_tracks)
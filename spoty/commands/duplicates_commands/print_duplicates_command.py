@@ -16,9 +16,19 @@ def print_duplicates(context: SpotyContext,
 Print a list of duplicates to console.
     """
 
-    for i, group in enumerate(context.duplicates_groups):
+    if context.duplicates_groups_stream is not None:
+        duplicates_groups = context.duplicates_groups_stream
+        groups_count = None  # unknown until all groups are found
+    else:
+        duplicates_groups = context.duplicates_groups
+        groups_count = len(context.duplicates_groups)
+
+    for i, group in enumerate(duplicates_groups):
         click.echo()
-        click.echo(f"--------------------------- GROUP {i+1}/{len(context.duplicates_groups)} ---------------------------")
+        if groups_count is None:
+            click.echo(f"--------------------------- GROUP {i+1} ---------------------------")
+        else:
+            click.echo(f"--------------------------- GROUP {i+1}/{groups_count} ---------------------------")
         if len(group.source_tags.items())>0:
             click.echo("Source:")
             spoty.utils.print_duplicates_tags_list([group.source_tags], print_pattern)
@@ -34,3 +44,17 @@ Print a list of duplicates to console.
 
     click.echo('\n------------------------------------------------------------')
     click.echo('\n'.join(context.summary))
+
+
+def get_required_tags(params: dict):
+    if params['print_pattern'] is not None:
+        return spoty.utils.get_pattern_tags(params['print_pattern'])
+
+    # pattern depends on the source of the track
+    tags = []
+    for print_pattern in settings.DUPLICATE_PRINT_PATTERN.values():
+        tags.extend(spoty.utils.get_pattern_tags(print_pattern))
+    return tags
+
+
+print_duplicates.get_required_tags = get_required_tags
@@ -16,6 +16,10 @@ def count_tracks(context: SpotyContext,
     """
 Print a number of tracks to console.
     """
+    if context.tags_stream is not None:
+        count_tags_stream(context, grouping_pattern)
+        return
+
     context.summary.append(f'Counting:')
 
     for i, tags_list in enumerate(context.tags_lists):
@@ -50,3 +54,25 @@ Print a number of tracks to console.
 
     click.echo('\n------------------------------------------------------------')
     click.echo('\n'.join(context.summary))
+
+
+def count_tags_stream(context: SpotyContext, grouping_pattern):
+    # summary of the previous commands is added when all tracks are received
+    tracks_count, groups_count = spoty.utils.count_tags_stream_grouped(context.tags_stream, grouping_pattern)
+    context.tags_stream = None
+
+    context.summary.append(f'Counting:')
+    context.summary.append(f'  {tracks_count} tracks.')
+    if groups_count > 0:
+        context.summary.append(f'  {groups_count} groups by pattern.')
+
+    click.echo('\n------------------------------------------------------------')
+    click.echo('\n'.join(context.summary))
+
+
+def get_required_tags(params: dict):
+    return spoty.utils.get_pattern_tags(params['grouping_pattern'])
+
+
+count_tracks.get_required_tags = get_required_tags
+count_tracks.reads_tags_stream = True
@@ -16,6 +16,9 @@ from spoty.commands import get_second_group
 from spoty.utils import SpotyContext
 from spoty import settings
 import spoty.utils
+import spoty.tag_table
+import spoty.filter_plan
+import spoty.filter_expression
 import click
 
 
@@ -34,9 +37,13 @@ import click
               default=settings.SPOTY.COMPARE_TAGS_DEFINITELY_DUPLICATE,
               help='Compare duplicates by this tags. It is optional. You can also change the list of tags in the config file.')
 @click.option('--leave-added-before', '--lab',
-              help='Leave only added to playlist before specified date.')
+              help='Leave only added to playlist before specified date. The date itself is not included. Dates are compared in whole seconds, fractions of seconds are dropped.')
 @click.option('--leave-added-after', '--laa',
-              help='Leave only added to playlist after specified date.')
+              help='Leave only added to playlist after specified date. The date itself is not included. Dates are compared in whole seconds, fractions of seconds are dropped.')
+@click.option('--leave-added-between', '--lbw', nargs=2,
+              help='Leave only added to playlist between two specified dates. The dates themselves are not included. Dates are compared in whole seconds, fractions of seconds are dropped, so "2020-01-01 10:00:00.5" is the same as "2020-01-01 10:00:00".')
+@click.option('--where', '--w',
+              help='Leave only tracks that match the expression. Example: "SPOTY_SOURCE == LOCAL and (YEAR < 2000 or GENRE contains rock)"')
 @click.option('--get-only-tags', '--got',
               help='Get only specified tags. All other tags will be removed. or Example: "SPOTIFY_TRACK_ID,ISRC,ARTIST,TITLE"')
 @click.pass_obj
@@ -49,6 +56,8 @@ def filter_tracks(context: SpotyContext,
                   duplicates_compare_tags,
                   leave_added_before,
                   leave_added_after,
+                  leave_added_between,
+                  where,
                   get_only_tags
                   ):
     """
@@ -64,9 +73,13 @@ Filter tracks.
                           duplicates_compare_tags,
                           leave_added_before,
                           leave_added_after,
+                          leave_added_between,
+                          where,
                           get_only_tags
                           )
 
+    spoty.utils.collect_tags_stream_if_needed(context)
+
 
 def filter_tracks_wrapper(context: SpotyContext,
                           # playlist_names,
@@ -77,68 +90,33 @@ def filter_tracks_wrapper(context: SpotyContext,
                           duplicates_compare_tags,
                           leave_added_before,
                           leave_added_after,
+                          leave_added_between,
+                          where,
                           get_only_tags
                           ):
+    # options are compiled to the plan of filters, which is run in one pass (see FilterPlan)
+
+    if context.tags_stream is not None:
+        plan = make_filter_plan(leave_have_tags, leave_no_tags, remove_duplicates, leave_duplicates,
+                                duplicates_compare_tags, leave_added_before, leave_added_after, leave_added_between,
+                                where)
+        context.tags_stream = stream_filter_tracks(context, context.tags_stream, plan, get_only_tags)
+        return
+
     tags_list = context.tags_lists[-1]  # get last tags list
 
     if len(tags_list) > 0:
         summary = []
         summary.append("Filtering:")
 
-        if len(leave_have_tags) > 0:
-            new_tags_list = spoty.utils.filter_tags_list_have_tags(tags_list, leave_have_tags)
-            if len(tags_list) - len(new_tags_list) != 0:
-                summary.append(
-                    f'  {len(tags_list) - len(new_tags_list)}/{len(tags_list)} tracks removed (have all of the specified tags).')
-            tags_list = new_tags_list
-
-        if len(leave_no_tags) > 0:
-            new_tags_list = spoty.utils.filter_tags_list_have_no_tags(tags_list, leave_no_tags)
-            if len(tags_list) - len(new_tags_list) != 0:
-                summary.append(
-                    f'  {len(tags_list) - len(new_tags_list)}/{len(tags_list)} tracks removed (not have any of the specified tags).')
-            tags_list = new_tags_list
-
-        if remove_duplicates:
-            compare_tags_list = spoty.utils.tuple_to_list(duplicates_compare_tags)
-            for compare_tags_str in compare_tags_list:
-                compare_tags = compare_tags_str.split(',')
-                new_tags_list, dup = spoty.utils.remove_duplicated_tags(tags_list, compare_tags, False)
-                if len(dup) > 0:
-                    summary.append(
-                        f'  {len(dup)}/{len(tags_list)} tracks removed (duplicates by tags: {compare_tags_str})')
-                tags_list = new_tags_list
-
-        if leave_duplicates:
-            compare_tags_list = spoty.utils.tuple_to_list(duplicates_compare_tags)
-            all_dup = []
-            for compare_tags_str in compare_tags_list:
-                compare_tags = compare_tags_str.split(',')
-                new_tags_list, dup = spoty.utils.remove_duplicated_tags(tags_list, compare_tags, False)
-                if len(dup) > 0:
-                    summary.append(
-                        f'   {len(dup)}/{len(tags_list)} tracks left (duplicates by tags: {compare_tags_str})')
-                tags_list = new_tags_list
-                all_dup.extend(dup)
-            tags_list = all_dup
-
-        if leave_added_after:
-            new_tags_list = spoty.utils.filter_added_after_date(tags_list, leave_added_after)
-            if len(tags_list) - len(new_tags_list) != 0:
-                summary.append(
-                    f'  {len(tags_list) - len(new_tags_list)}/{len(tags_list)} tracks removed (not added after specified date).')
-            tags_list = new_tags_list
-
-        if leave_added_before:
-            new_tags_list = spoty.utils.filter_added_before_date(tags_list, leave_added_before)
-            if len(tags_list) - len(new_tags_list) != 0:
-                summary.append(
-                    f'  {len(tags_list) - len(new_tags_list)}/{len(tags_list)} tracks removed (not added before specified date).')
-            tags_list = new_tags_list
+        plan = make_filter_plan(leave_have_tags, leave_no_tags, remove_duplicates, leave_duplicates,
+                                duplicates_compare_tags, leave_added_before, leave_added_after, leave_added_between,
+                                where)
+        tags_list, plan_summary = plan.run(tags_list)
+        summary.extend(plan_summary)
 
         if get_only_tags:
-            get_only_tags_list = str.split(get_only_tags, ',')
-            tags_list = spoty.utils.get_only_tags(tags_list, get_only_tags_list)
+            tags_list = get_only_tags_of_tracks(tags_list, get_only_tags)
 
         if len(summary) > 1:
             context.summary.extend(summary)
@@ -146,6 +124,94 @@ def filter_tracks_wrapper(context: SpotyContext,
     context.tags_lists[-1] = tags_list
 
 
+def stream_filter_tracks(context: SpotyContext, tags_stream, plan: spoty.filter_plan.FilterPlan, get_only_tags):
+    # summary is added when all tracks are filtered
+
+    def add_summary(plan_summary: list):
+        if len(plan_summary) > 0:
+            context.summary.append("Filtering:")
+            context.summary.extend(plan_summary)
+
+    for tags_list in plan.stream(tags_stream, add_summary):
+        if get_only_tags:
+            tags_list = get_only_tags_of_tracks(tags_list, get_only_tags)
+        yield tags_list
+
+
+def make_filter_plan(leave_have_tags,
+                     leave_no_tags,
+                     remove_duplicates,
+                     leave_duplicates,
+                     duplicates_compare_tags,
+                     leave_added_before,
+                     leave_added_after,
+                     leave_added_between,
+                     where
+                     ):
+    plan = spoty.filter_plan.FilterPlan()
+
+    if len(leave_have_tags) > 0:
+        plan.add(spoty.filter_plan.have_all_tags_filter([tag.upper() for tag in leave_have_tags]))
+
+    if len(leave_no_tags) > 0:
+        plan.add(spoty.filter_plan.have_no_tags_filter([tag.upper() for tag in leave_no_tags]))
+
+    if remove_duplicates:
+        plan.add(spoty.filter_plan.DuplicatesFilter(spoty.utils.tuple_to_list(duplicates_compare_tags)))
+
+    if leave_duplicates:
+        plan.add(spoty.filter_plan.DuplicatesFilter(spoty.utils.tuple_to_list(duplicates_compare_tags), True))
+
+    if leave_added_after:
+        plan.add(spoty.filter_plan.added_between_filter(
+            '  {removed}/{count} tracks removed (not added after specified date).',
+            after=spoty.utils.parse_date_epoch(leave_added_after)))
+
+    if leave_added_before:
+        plan.add(spoty.filter_plan.added_between_filter(
+            '  {removed}/{count} tracks removed (not added before specified date).',
+            before=spoty.utils.parse_date_epoch(leave_added_before)))
+
+    if leave_added_between:
+        plan.add(spoty.filter_plan.added_between_filter(
+            '  {removed}/{count} tracks removed (not added between specified dates).',
+            spoty.utils.parse_date_epoch(leave_added_between[0]),
+            spoty.utils.parse_date_epoch(leave_added_between[1])))
+
+    if where:
+        try:
+            expression = spoty.filter_expression.FilterExpression(where)
+        except spoty.filter_expression.FilterExpressionError as e:
+            click.echo(f'Invalid filter expression "{where}": {e}', err=True)
+            exit()
+        plan.add(spoty.filter_plan.TrackFilter(
+            '  {removed}/{count} tracks removed (not match the expression: ' + where.replace('{', '{{').replace('}', '}}') + ').',
+            expression.check))
+
+    return plan
+
+
+def get_only_tags_of_tracks(tags_list: list, get_only_tags: str):
+    get_only_tags_list = str.split(get_only_tags, ',')
+    table = spoty.tag_table.TagTable(tags_list)
+    return table.project(table.all(), get_only_tags_list)
+
+
+def get_required_tags(params: dict):
+    tags = [tag.upper() for tag in params['leave_have_tags'] + params['leave_no_tags']]
+    if params['remove_duplicates'] or params['leave_duplicates']:
+        tags.extend(spoty.utils.get_compare_tags_list_tags(params['duplicates_compare_tags']))
+    if params['where']:
+        try:
+            tags.extend(spoty.filter_expression.FilterExpression(params['where']).get_tags())
+        except spoty.filter_expression.FilterExpressionError:
+            return None  # the error will be shown when the filter is run
+    return spoty.utils.get_tags_with_allies(tags)
+
+
+filter_tracks.get_required_tags = get_required_tags
+filter_tracks.reads_tags_stream = True
+
 filter_tracks.add_command(count_command.count_tracks)
 filter_tracks.add_command(print_command.print_tracks)
 filter_tracks.add_command(export_command.export_tracks)
@@ -13,6 +13,8 @@ import spoty.deezer_api
 import spoty.spotify_api
 import spoty.audio_files
 import spoty.utils
+import spoty.duplicates_index
+import spoty.minhash_index
 import click
 import os
 from datetime import datetime
@@ -29,12 +31,34 @@ from datetime import datetime
               help='Find only definitely duplicates.')
 @click.option('--only-prob', '--prob', '-p', is_flag=True,
               help='Find only probably duplicates.')
+@click.option('--clusters', '-c', is_flag=True,
+              help='Group all tracks connected by any match. Groups and their numbers do not depend on the order of tracks.')
+@click.option('--incremental', '-i', is_flag=True,
+              help='Save found matches to the index file and compare only new and changed tracks on the next run. Groups tracks like --clusters.')
+@click.option('--index-file', '--if',
+              help='Index file name for --incremental. By default, the file is located in the config directory.')
+@click.option('--jobs', '-j', type=int,
+              help='Number of worker processes. By default, WORKERS from the config file or the number of CPUs is used.')
+@click.option('--similar', '-s', is_flag=True,
+              help='Also find probably duplicates with similar artist and title (for example, remixes and "feat." variants). Not used with --clusters and --incremental.')
+@click.option('--similarity-threshold', '--st', type=float, show_default=True,
+              default=settings.SPOTY.SIMILARITY_THRESHOLD,
+              help='Minimum similarity of artist and title (0-1) for --similar.')
+@click.option('--stream', is_flag=True,
+              help='Print or export each group of duplicates as soon as no more tracks can be added to it and all previous groups are printed. Groups and their numbers are the same as without --stream. Can be used only with "print" and "export" commands.')
 @click.pass_obj
 def find_duplicates(context: SpotyContext,
                     compare_tags_def,
                     compare_tags_prob,
                     only_def,
-                    only_prob
+                    only_prob,
+                    clusters,
+                    incremental,
+                    index_file,
+                    jobs,
+                    similar,
+                    similarity_threshold,
+                    stream
                     ):
     """
 Find duplicates.
@@ -50,8 +74,36 @@ Find duplicates.
     if only_prob:
         compare_tags_def = []
 
-    duplicates_groups, unique_tracks = spoty.utils.find_duplicates_in_tag_list2(tags_list, compare_tags_def,
-                                                                                compare_tags_prob, True)
+    index_stats = None
+    similarity = similarity_threshold if similar else None
+    if similar and not 0 < similarity_threshold <= 1:
+        click.echo(f'"--similarity-threshold" must be greater than 0 and not greater than 1', err=True)
+        exit()
+
+    if stream:
+        if click.get_current_context().invoked_subcommand not in ['print', 'export']:
+            click.echo(f'"--stream" can be used only with "print" and "export" commands', err=True)
+            exit()
+        if incremental or clusters or similar:
+            click.echo(f'"--stream" can not be used with "--incremental", "--clusters" and "--similar"', err=True)
+            exit()
+
+        duplicates_groups = spoty.utils.iterate_duplicates_in_tag_list(tags_list, compare_tags_def, compare_tags_prob,
+                                                                      True, jobs)
+        context.duplicates_groups_stream = stream_duplicates_groups(context, duplicates_groups)
+        return
+
+    if incremental:
+        duplicates_groups, unique_tracks, index_stats = spoty.duplicates_index.find_duplicates_incremental(
+            tags_list, compare_tags_def, compare_tags_prob, index_file, True, jobs)
+    elif clusters:
+        duplicates_groups, unique_tracks = spoty.utils.find_duplicates_in_tag_list_clusters(tags_list, compare_tags_def,
+                                                                                            compare_tags_prob, True,
+                                                                                            jobs)
+    else:
+        duplicates_groups, unique_tracks = spoty.utils.find_duplicates_in_tag_list2(tags_list, compare_tags_def,
+                                                                                    compare_tags_prob, True, jobs,
+                                                                                    similarity)
 
     context.duplicates_groups = duplicates_groups
     context.unique_first_tracks = unique_tracks
@@ -63,13 +115,47 @@ Find duplicates.
         total_def_duplicates_count += len(group.def_duplicates)
         total_prob_duplicates_count += len(group.prob_duplicates)
 
+    add_summary(context, total_def_duplicates_count, total_prob_duplicates_count, index_stats)
+
+
+def stream_duplicates_groups(context: SpotyContext, duplicates_groups):
+    # summary is added when all groups are found
+    total_def_duplicates_count = 0
+    total_prob_duplicates_count = 0
+
+    for group in duplicates_groups:
+        total_def_duplicates_count += len(group.def_duplicates)
+        total_prob_duplicates_count += len(group.prob_duplicates)
+        yield group
+
+    add_summary(context, total_def_duplicates_count, total_prob_duplicates_count)
+
+
+def add_summary(context: SpotyContext, total_def_duplicates_count: int, total_prob_duplicates_count: int,
+                index_stats: spoty.duplicates_index.DuplicatesIndexStats = None):
     context.summary.append("Finding duplicates:")
+    if index_stats is not None:
+        context.summary.append(
+            f'  {index_stats.new_count} new, {index_stats.changed_count} changed, {index_stats.removed_count} removed tracks compared with duplicates index.')
     if total_def_duplicates_count > 0:
         context.summary.append(f'  {total_def_duplicates_count} definitely duplicates found')
     if total_prob_duplicates_count > 0:
         context.summary.append(f'  {total_prob_duplicates_count} probably duplicates found')
 
 
+def get_required_tags(params: dict):
+    # tracks are ordered and identified by all tags in clusters and index file
+    if params['clusters'] or params['incremental']:
+        return None
+
+    tags = spoty.utils.get_compare_tags_list_tags(params['compare_tags_def'] + params['compare_tags_prob'])
+    if params['similar']:
+        tags.extend(spoty.minhash_index.similarity_tags)
+    return tags
+
+
+find_duplicates.get_required_tags = get_required_tags
+
 find_duplicates.add_command(add_missing_tags_command.add_missing_tags)
 find_duplicates.add_command(export_duplicates_command.export_duplicates)
 find_duplicates.add_command(print_duplicates_command.print_duplicates)
@@ -21,6 +21,10 @@ def print_tracks(context: SpotyContext,
 Print a list of tracks to console.
     """
 
+    if context.tags_stream is not None:
+        print_tags_stream(context, grouping_pattern, print_pattern)
+        return
+
     for i, tags_list in enumerate(context.tags_lists):
         if len(context.tags_lists) > 1:
             click.echo()
@@ -47,3 +51,27 @@ Print a list of tracks to console.
 
     click.echo('\n------------------------------------------------------------')
     click.echo('\n'.join(context.summary))
+
+
+def print_tags_stream(context: SpotyContext, grouping_pattern, print_pattern):
+    # summary of the previous commands is added when all tracks are received
+    tracks_count, groups_count = spoty.utils.print_tags_stream_grouped(context.tags_stream, print_pattern,
+                                                                       grouping_pattern)
+    context.tags_stream = None
+
+    if groups_count == 0:
+        context.summary.append(f'Total {tracks_count} tracks listed.')
+    else:
+        context.summary.append(f'Total {tracks_count} tracks listed (grouped into {groups_count} playlists).')
+
+    click.echo('\n------------------------------------------------------------')
+    click.echo('\n'.join(context.summary))
+
+
+def get_required_tags(params: dict):
+    return spoty.utils.get_pattern_tags(params['grouping_pattern']) \
+           + spoty.utils.get_pattern_tags(params['print_pattern'])
+
+
+print_tracks.get_required_tags = get_required_tags
+print_tracks.reads_tags_stream = True
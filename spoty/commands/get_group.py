@@ -21,11 +21,30 @@ import spoty.deezer_api
 import spoty.audio_files
 import spoty.csv_playlist
 import spoty.m3u8_playlist
+import spoty.string_pool
 import spoty.utils
+import concurrent.futures
 import click
 
 
-@click.group("get")
+def get_next_args(ctx: click.Context):
+    # arguments of the next commands after parsing the group options
+    protected_args = getattr(ctx, '_protected_args', None)  # protected_args is deprecated since click 8.2
+    if protected_args is None:
+        protected_args = ctx.protected_args
+    return protected_args + ctx.args
+
+
+class GetTracksGroup(click.Group):
+    """Keeps arguments of the next commands, because click removes them before running the group callback."""
+
+    def parse_args(self, ctx, args):
+        rest = super().parse_args(ctx, args)
+        ctx.meta['spoty.next_args'] = get_next_args(ctx)
+        return rest
+
+
+@click.group("get", cls=GetTracksGroup)
 @click.option('--spotify-playlist', '--sp', multiple=True,
               help='Get tracks from Spotify playlist URI or ID.')
 @click.option('--spotify-entire-library', '--s', multiple=True,
@@ -48,6 +67,10 @@ import click
               help='Do not search in subdirectories from the specified path.')
 @click.option('--no-spoty-tags', '-t', is_flag=True,
               help='Do not add special spoty tags.')
+@click.option('--jobs', '-j', type=int,
+              help='Number of worker processes for reading tags of audio files. By default, WORKERS from the config file or the number of CPUs is used.')
+@click.option('--stream', is_flag=True,
+              help='Pass tracks to the next commands as soon as they are read from each source (file, playlist). "filter", "count" and "print" process tracks as they come, other commands wait for all tracks. Printed groups are in order of tracks, local audio files are not reordered by playlists.')
 @click.pass_context
 def get_tracks(
         ctx,
@@ -61,7 +84,9 @@ def get_tracks(
         csv,
         m3u8,
         no_recursive,
-        no_spoty_tags
+        no_spoty_tags,
+        jobs,
+        stream
 ):
     """
 Get tracks from sources for further actions (see next commands).
@@ -71,6 +96,7 @@ Get tracks from sources for further actions (see next commands).
         ctx.obj = SpotyContext()
 
     ctx.obj.summary.append("Collecting:")
+    ctx.obj.required_tags = get_required_tags(ctx)
 
     get_tracks_wrapper(
         ctx.obj,
@@ -84,9 +110,41 @@ Get tracks from sources for further actions (see next commands).
         csv,
         m3u8,
         no_recursive,
-        no_spoty_tags
+        no_spoty_tags,
+        stream,
+        jobs
     )
 
+    spoty.utils.collect_tags_stream_if_needed(ctx.obj)
+
+
+def get_required_tags(ctx: click.Context):
+    # tags which the next commands of the chain need, None if all tags are needed.
+    # commands tell their tags by get_required_tags attribute: func(params) -> list or None
+    required_tags = set(spoty.utils.always_read_tags)
+
+    command = ctx.command
+    parent_ctx = ctx
+    args = ctx.meta.get('spoty.next_args', [])
+    while len(args) > 0:
+        name, command, args = command.resolve_command(parent_ctx, args)
+        get_command_tags = getattr(command, 'get_required_tags', None)
+        if get_command_tags is None:
+            return None
+
+        command_ctx = command.make_context(name, list(args), parent=parent_ctx, resilient_parsing=True)
+        command_tags = get_command_tags(command_ctx.params)
+        if command_tags is None:
+            return None
+        required_tags.update(command_tags)
+
+        if not isinstance(command, click.Group):
+            break
+        parent_ctx = command_ctx
+        args = get_next_args(command_ctx)
+
+    return required_tags
+
 
 def get_tracks_wrapper(
         context: SpotyContext,
@@ -100,14 +158,13 @@ def get_tracks_wrapper(
         csv,
         m3u8,
         no_recursive,
-        no_spoty_tags
+        no_spoty_tags,
+        stream=False,
+        jobs: int = None
 ):
-    all_tags_list = []
-
-    # get m3u8
+    # find files
 
     m3u8_files = []
-    tags_list_from_m3u8 = []
 
     if len(m3u8) > 0:
         m3u8_paths = []
@@ -124,15 +181,7 @@ def get_tracks_wrapper(
         file_names = spoty.m3u8_playlist.find_m3u8s_in_paths(m3u8_paths, not no_recursive)
         m3u8_files.extend(file_names)
 
-        tags_list = spoty.m3u8_playlist.read_tags_from_m3u8s(m3u8_files,not no_spoty_tags)
-        tags_list_from_m3u8.extend(tags_list)
-        all_tags_list.extend(tags_list)
-
-
-    # get csv
-
     csv_files = []
-    tags_list_from_csv = []
 
     if len(csv) > 0:
         csv_paths = []
@@ -149,14 +198,7 @@ def get_tracks_wrapper(
         file_names = spoty.csv_playlist.find_csvs_in_paths(csv_paths, not no_recursive)
         csv_files.extend(file_names)
 
-        tags_list = spoty.csv_playlist.read_tags_from_csvs(csv_files,not no_spoty_tags)
-        tags_list_from_csv.extend(tags_list)
-        all_tags_list.extend(tags_list)
-
-    # get audio
-
     audio_files = []
-    tags_list_from_audio = []
 
     if len(audio) > 0:
         audio_paths = []
@@ -173,95 +215,271 @@ def get_tracks_wrapper(
         file_names = spoty.audio_files.find_audio_files_in_paths(audio_paths, not no_recursive)
         audio_files.extend(file_names)
 
-        tags_list = spoty.audio_files.read_audio_files_tags(audio_files,not no_spoty_tags)
+    collected = CollectedTracks(m3u8_files, csv_files)
+
+    if stream:
+        context.tags_lists.append([])
+        context.tags_stream = stream_tracks(
+            context,
+            collected,
+            spotify_playlist,
+            spotify_entire_library,
+            spotify_entire_library_regex,
+            deezer_playlist,
+            deezer_entire_library,
+            deezer_entire_library_regex,
+            audio_files,
+            no_spoty_tags
+        )
+        return
+
+    required_tags = context.required_tags
+
+    # spotify and deezer are read in threads while local files are read.
+    # tracks are added in the same order as if sources were read one after another
+
+    network_sources = []
+    if len(spotify_playlist) > 0 or len(spotify_entire_library) > 0 or len(spotify_entire_library_regex) > 0:
+        network_sources.append((read_spotify_sources, spotify_playlist, spotify_entire_library,
+                                spotify_entire_library_regex))
+    if len(deezer_playlist) > 0 or len(deezer_entire_library) > 0 or len(deezer_entire_library_regex) > 0:
+        network_sources.append((read_deezer_sources, deezer_playlist, deezer_entire_library,
+                                deezer_entire_library_regex))
+
+    # repeated tag values are shared while tracks are read
+    has_local_sources = len(m3u8_files) > 0 or len(csv_files) > 0 or len(audio_files) > 0
+    with spoty.string_pool.pooling() as pool:
+        if len(network_sources) > 1 or (len(network_sources) > 0 and has_local_sources):
+            # progress bars of threads are not shown, they would be mixed with the progress bar of local files
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(network_sources)) as executor:
+                futures = [executor.submit(read_sources, *sources, required_tags, False)
+                           for read_sources, *sources in network_sources]
+                all_tags_list = read_local_sources(collected, m3u8_files, csv_files, audio_files, no_spoty_tags,
+                                                   required_tags, jobs)
+                network_results = [future.result() for future in futures]
+        else:
+            all_tags_list = read_local_sources(collected, m3u8_files, csv_files, audio_files, no_spoty_tags,
+                                               required_tags, jobs)
+            network_results = [read_sources(*sources, required_tags)
+                               for read_sources, *sources in network_sources]
+
+    for source, tags_list, playlists in network_results:
+        if source == 'spotify':
+            collected.spotify_playlists.extend(playlists)
+            collected.spotify_count += len(tags_list)
+        else:
+            collected.deezer_playlists.extend(playlists)
+            collected.deezer_count += len(tags_list)
+        all_tags_list.extend(tags_list)
+
+    collected.add_summary(context, pool)
+
+    # make context
+
+    context.tags_lists.append(all_tags_list)
+
+
+def read_local_sources(collected, m3u8_files, csv_files, audio_files, no_spoty_tags, required_tags, jobs):
+    all_tags_list = []
+
+    # get m3u8
+
+    if len(m3u8_files) > 0:
+        tags_list = spoty.m3u8_playlist.read_tags_from_m3u8s(m3u8_files, not no_spoty_tags, True, required_tags,
+                                                             jobs)
+        collected.m3u8_count += len(tags_list)
+        all_tags_list.extend(tags_list)
+
+    # get csv
+
+    if len(csv_files) > 0:
+        tags_list = spoty.csv_playlist.read_tags_from_csvs(csv_files, not no_spoty_tags, required_tags)
+        collected.csv_count += len(tags_list)
+        all_tags_list.extend(tags_list)
+
+    # get audio
+
+    if len(audio_files) > 0:
+        tags_list = spoty.audio_files.read_audio_files_tags(audio_files, not no_spoty_tags, True, required_tags, jobs)
         tags_list = spoty.utils.add_playlist_index_from_playlist_names(tags_list)
-        tags_list_from_audio.extend(tags_list)
+        collected.audio_count += len(tags_list)
         all_tags_list.extend(tags_list)
 
-    # get spotify
+    return all_tags_list
 
-    spotify_playlists = []
-    tags_list_from_spotify = []
+
+def read_spotify_sources(spotify_playlist, spotify_entire_library, spotify_entire_library_regex, required_tags,
+                         show_progress=True):
+    all_tags_list = []
+    all_playlists = []
 
     if len(spotify_playlist) > 0:
         pl = spoty.utils.tuple_to_list(spotify_playlist)
-        tracks, tags_list, playlists = spoty.spotify_api.get_tracks_from_playlists(pl)
-        spotify_playlists.extend(playlists)
-        tags_list_from_spotify.extend(tags_list)
+        tracks, tags_list, playlists = spoty.spotify_api.get_tracks_from_playlists(pl, required_tags=required_tags,
+                                                                                   show_progress=show_progress)
+        all_playlists.extend(playlists)
         all_tags_list.extend(tags_list)
 
     if len(spotify_entire_library) > 0:
         for user_id in spotify_entire_library:
-            tracks, tags_list, playlists = spoty.spotify_api.get_tracks_of_spotify_user(user_id)
-            spotify_playlists.extend(playlists)
-            tags_list_from_spotify.extend(tags_list)
+            tracks, tags_list, playlists = spoty.spotify_api.get_tracks_of_spotify_user(user_id,
+                                                                                        required_tags=required_tags,
+                                                                                        show_progress=show_progress)
+            all_playlists.extend(playlists)
             all_tags_list.extend(tags_list)
 
     if len(spotify_entire_library_regex) > 0:
         for user_and_reg in spotify_entire_library_regex:
             tracks, tags_list, playlists = spoty.spotify_api.get_tracks_of_spotify_user(user_and_reg[0],
-                                                                                        user_and_reg[1])
-            spotify_playlists.extend(playlists)
-            tags_list_from_spotify.extend(tags_list)
+                                                                                        user_and_reg[1],
+                                                                                        required_tags,
+                                                                                        show_progress)
+            all_playlists.extend(playlists)
             all_tags_list.extend(tags_list)
 
-    # get deezer
+    return 'spotify', all_tags_list, all_playlists
 
-    deezer_playlists = []
-    tags_list_from_deezer = []
+
+def read_deezer_sources(deezer_playlist, deezer_entire_library, deezer_entire_library_regex, required_tags,
+                        show_progress=True):
+    all_tags_list = []
+    all_playlists = []
 
     if len(deezer_playlist) > 0:
         pl = spoty.utils.tuple_to_list(deezer_playlist)
-        tracks, tags_list, playlists = spoty.deezer_api.get_tracks_from_playlists(pl)
+        tracks, tags_list, playlists = spoty.deezer_api.get_tracks_from_playlists(pl, required_tags=required_tags,
+                                                                                  show_progress=show_progress)
         # tags_list = spoty.deezer_api.add_track_release_dates(tags_list)
-        deezer_playlists.extend(playlists)
-        tags_list_from_deezer.extend(tags_list)
+        all_playlists.extend(playlists)
         all_tags_list.extend(tags_list)
 
     if len(deezer_entire_library) > 0:
         for user_id in deezer_entire_library:
-            tracks, tags_list, playlists = spoty.deezer_api.get_tracks_of_deezer_user(user_id)
-            deezer_playlists.extend(playlists)
-            tags_list_from_deezer.extend(tags_list)
+            tracks, tags_list, playlists = spoty.deezer_api.get_tracks_of_deezer_user(user_id,
+                                                                                      required_tags=required_tags,
+                                                                                      show_progress=show_progress)
+            all_playlists.extend(playlists)
             all_tags_list.extend(tags_list)
 
     if len(deezer_entire_library_regex) > 0:
         for user_and_reg in deezer_entire_library_regex:
-            tracks, tags_list, playlists = spoty.deezer_api.get_tracks_of_deezer_user(user_and_reg[0], user_and_reg[1])
-            deezer_playlists.extend(playlists)
-            tags_list_from_deezer.extend(tags_list)
+            tracks, tags_list, playlists = spoty.deezer_api.get_tracks_of_deezer_user(user_and_reg[0], user_and_reg[1],
+                                                                                      required_tags, show_progress)
+            all_playlists.extend(playlists)
             all_tags_list.extend(tags_list)
 
-    # make summary
-
-    summary = []
-
-    if len(tags_list_from_spotify) > 0:
-        context.summary.append(
-            f'  {len(tags_list_from_spotify)} tracks found in {len(spotify_playlists)} Spotify playlists.')
-    if len(tags_list_from_deezer) > 0:
-        context.summary.append(
-            f'  {len(tags_list_from_deezer)} tracks found in {len(deezer_playlists)} Deezer playlists.')
-    if len(tags_list_from_audio) > 0:
-        context.summary.append(f'  {len(tags_list_from_audio)} audio files found in local path.')
-    if len(tags_list_from_csv) > 0:
-        context.summary.append(f'  {len(tags_list_from_csv)} tracks found in {len(csv_files)} csv playlists.')
-    if len(tags_list_from_m3u8) > 0:
-        context.summary.append(f'  {len(tags_list_from_m3u8)} tracks found in {len(m3u8_files)} m3u8 playlists.')
-
-    if not (len(tags_list_from_spotify) == len(all_tags_list) or len(tags_list_from_spotify) == 0) \
-            or not (len(tags_list_from_deezer) == len(all_tags_list) or len(tags_list_from_deezer) == 0) \
-            or not (len(tags_list_from_audio) == len(all_tags_list) or len(tags_list_from_audio) == 0) \
-            or not (len(tags_list_from_csv) == len(all_tags_list) or len(tags_list_from_csv) == 0)\
-            or not (len(tags_list_from_m3u8) == len(all_tags_list) or len(tags_list_from_m3u8) == 0):
-        context.summary.append(f'  {len(all_tags_list)} total tracks collected.')
-
-    if len(all_tags_list) == 0:
-        context.summary.append(f'  {len(all_tags_list)} total tracks collected.')
+    return 'deezer', all_tags_list, all_playlists
 
-    # make context
 
-    context.tags_lists.append(all_tags_list)
+def stream_tracks(
+        context: SpotyContext,
+        collected,
+        spotify_playlist,
+        spotify_entire_library,
+        spotify_entire_library_regex,
+        deezer_playlist,
+        deezer_entire_library,
+        deezer_entire_library_regex,
+        audio_files,
+        no_spoty_tags
+):
+    # tracks are yielded in the same order as they are collected without the stream.
+    # summary is added when all tracks are read
+    required_tags = context.required_tags
+
+    with spoty.string_pool.pooling() as pool:
+        for m3u8_file in collected.m3u8_files:
+            tags_list = spoty.m3u8_playlist.read_tags_from_m3u8(m3u8_file, not no_spoty_tags, True, required_tags)
+            collected.m3u8_count += len(tags_list)
+            yield tags_list
+
+        for csv_file in collected.csv_files:
+            tags_list = spoty.csv_playlist.read_tags_from_csv(csv_file, not no_spoty_tags,
+                                                              required_tags=required_tags)
+            collected.csv_count += len(tags_list)
+            yield tags_list
+
+        last_indexes = {}
+        for tags_list in spoty.audio_files.iterate_audio_files_tags(audio_files, not no_spoty_tags, True,
+                                                                    required_tags):
+            tags_list = spoty.utils.add_playlist_index_in_stream(tags_list, last_indexes)
+            collected.audio_count += len(tags_list)
+            yield tags_list
+
+        spotify_ids_lists = [spoty.utils.tuple_to_list(spotify_playlist)]
+        spotify_ids_lists.extend(spoty.spotify_api.get_playlists_ids_of_spotify_user(user_id)
+                                 for user_id in spotify_entire_library)
+        spotify_ids_lists.extend(spoty.spotify_api.get_playlists_ids_of_spotify_user(user_and_reg[0],
+                                                                                     user_and_reg[1])
+                                 for user_and_reg in spotify_entire_library_regex)
+        for ids in spotify_ids_lists:
+            for playlist_id, tracks, tags_list in spoty.spotify_api.iterate_tracks_from_playlists(
+                    ids, required_tags=required_tags):
+                collected.spotify_playlists.append(playlist_id)
+                collected.spotify_count += len(tags_list)
+                yield tags_list
+
+        deezer_ids_lists = [spoty.utils.tuple_to_list(deezer_playlist)]
+        deezer_ids_lists.extend(spoty.deezer_api.get_playlists_ids_of_deezer_user(user_id)
+                                for user_id in deezer_entire_library)
+        deezer_ids_lists.extend(spoty.deezer_api.get_playlists_ids_of_deezer_user(user_and_reg[0], user_and_reg[1])
+                                for user_and_reg in deezer_entire_library_regex)
+        for ids in deezer_ids_lists:
+            for playlist_id, tracks, tags_list in spoty.deezer_api.iterate_tracks_from_playlists(
+                    ids, required_tags=required_tags):
+                collected.deezer_playlists.append(playlist_id)
+                collected.deezer_count += len(tags_list)
+                yield tags_list
+
+        collected.add_summary(context, pool)
+
+
+class CollectedTracks:
+    """Counts of tracks collected from each kind of source, for the summary."""
+    m3u8_files: list
+    csv_files: list
+    spotify_playlists: list
+    deezer_playlists: list
+    m3u8_count: int
+    csv_count: int
+    audio_count: int
+    spotify_count: int
+    deezer_count: int
+
+    def __init__(self, m3u8_files: list, csv_files: list):
+        self.m3u8_files = m3u8_files
+        self.csv_files = csv_files
+        self.spotify_playlists = []
+        self.deezer_playlists = []
+        self.m3u8_count = 0
+        self.csv_count = 0
+        self.audio_count = 0
+        self.spotify_count = 0
+        self.deezer_count = 0
+
+    def add_summary(self, context: SpotyContext, pool: spoty.string_pool.StringPool):
+        counts = [self.spotify_count, self.deezer_count, self.audio_count, self.csv_count, self.m3u8_count]
+        total_count = sum(counts)
+
+        if self.spotify_count > 0:
+            context.summary.append(
+                f'  {self.spotify_count} tracks found in {len(self.spotify_playlists)} Spotify playlists.')
+        if self.deezer_count > 0:
+            context.summary.append(
+                f'  {self.deezer_count} tracks found in {len(self.deezer_playlists)} Deezer playlists.')
+        if self.audio_count > 0:
+            context.summary.append(f'  {self.audio_count} audio files found in local path.')
+        if self.csv_count > 0:
+            context.summary.append(f'  {self.csv_count} tracks found in {len(self.csv_files)} csv playlists.')
+        if self.m3u8_count > 0:
+            context.summary.append(f'  {self.m3u8_count} tracks found in {len(self.m3u8_files)} m3u8 playlists.')
+
+        if any(0 < count < total_count for count in counts) or total_count == 0:
+            context.summary.append(f'  {total_count} total tracks collected.')
+
+        if pool.reused_count > 0:
+            context.summary.append(
+                f'  {pool.reused_count} repeated tag values shared ({pool.saved_bytes / 1024 / 1024:.1f} MB saved).')
 
 
 get_tracks.add_command(filter_group.filter_tracks)
@@ -69,6 +69,8 @@ Collect second list of tracks for further actions (see next commands).
                                  )
 
 
+get_second.get_required_tags = lambda params: []  # tags are read by the first get command for the entire chain
+
 get_second.add_command(filter_second_group.filter_second)
 
 get_second.add_command(count_command.count_tracks)
@@ -27,9 +27,13 @@ import click
               default=settings.SPOTY.COMPARE_TAGS_DEFINITELY_DUPLICATE,
               help='Compare duplicates by this tags. It is optional. You can also change the list of tags in the config file.')
 @click.option('--leave-added-before', '--lab',
-              help='Leave only added to playlist before specified date.')
+              help='Leave only added to playlist before specified date. The date itself is not included. Dates are compared in whole seconds, fractions of seconds are dropped.')
 @click.option('--leave-added-after', '--laa',
-              help='Leave only added to playlist after specified date.')
+              help='Leave only added to playlist after specified date. The date itself is not included. Dates are compared in whole seconds, fractions of seconds are dropped.')
+@click.option('--leave-added-between', '--lbw', nargs=2,
+              help='Leave only added to playlist between two specified dates. The dates themselves are not included. Dates are compared in whole seconds, fractions of seconds are dropped, so "2020-01-01 10:00:00.5" is the same as "2020-01-01 10:00:00".')
+@click.option('--where', '--w',
+              help='Leave only tracks that match the expression. Example: "SPOTY_SOURCE == LOCAL and (YEAR < 2000 or GENRE contains rock)"')
 @click.option('--get-only-tags', '--got',
               help='Get only specified tags. All other tags will be removed. or Example: "SPOTIFY_TRACK_ID,ISRC,ARTIST,TITLE"')
 @click.pass_obj
@@ -42,6 +46,8 @@ def filter_second(context: SpotyContext,
                   duplicates_compare_tags,
                   leave_added_before,
                   leave_added_after,
+                  leave_added_between,
+                  where,
                   get_only_tags
                   ):
     """
@@ -57,6 +63,8 @@ Filter tracks.
                                        duplicates_compare_tags,
                                        leave_added_before,
                                        leave_added_after,
+                                       leave_added_between,
+                                       where,
                                        get_only_tags
                                        )
 
@@ -31,12 +31,15 @@ from datetime import datetime
               help='Find only definitely duplicates.')
 @click.option('--only-prob', '--prob', '-p', is_flag=True,
               help='Find only probably duplicates.')
+@click.option('--jobs', '-j', type=int,
+              help='Number of worker processes. By default, WORKERS from the config file or the number of CPUs is used.')
 @click.pass_obj
 def find_duplicates_second(context: SpotyContext,
                            compare_tags_def,
                            compare_tags_prob,
                            only_def,
-                           only_prob
+                           only_prob,
+                           jobs
                            ):
     """
 Find duplicates between the first and second list of tracks.
@@ -59,7 +62,7 @@ Find duplicates between the first and second list of tracks.
 
     duplicates_groups, unique_source_tracks, unique_dest_tracks, sources_def_dups, sources_prob_dups = \
         spoty.utils.find_duplicates_in_tag_lists(source_list, dest_list, compare_tags_def, compare_tags_prob,
-                                                 True, True)
+                                                 True, True, jobs)
 
     context.duplicates_groups = duplicates_groups
     context.unique_first_tracks = unique_source_tracks
@@ -1,6 +1,8 @@
 from spoty import log
 import spoty.utils
 import spoty.audio_files
+import spoty.string_pool
+import spoty.track
 import click
 import os
 import csv
@@ -195,16 +197,44 @@ def write_tags_to_csv(tags_list, csv_file_name, append=False, write_empty=False)
         writer.writerows(rows)
 
 
-def read_tags_from_csvs(csv_file_names, add_spoty_tags=True):
+def write_tags_to_csv_incrementally(tags_iter, csv_file_name, keys):
+    # tracks are written as soon as they are received, so all keys must be known before
+    keys = [key for key in keys if key != 'SPOTY_PLAYLIST_INDEX' and key != 'LENGTH']
+    keys = spoty.utils.reorder_tag_keys_main_first(keys)
+
+    count = 0
+
+    os.makedirs(os.path.dirname(csv_file_name), exist_ok=True)
+    with open(csv_file_name, 'w', encoding='utf-8-sig', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(keys)  # header
+        for tags in tags_iter:
+            row = []
+            for key in keys:
+                value = tags.get(key, "")
+                if type(value) is str and len(value) > 131072:
+                    mess = f'Tag "{key}" has value larger than csv field limit (131072) and will be truncated (file: "{csv_file_name}", line: {count + 1}).'
+                    click.echo('\n' + mess)
+                    log.warning(mess)
+                    value = value[0: 131071]
+                row.append(value)
+            writer.writerow(row)
+            count += 1
+
+    return count
+
+
+def read_tags_from_csvs(csv_file_names, add_spoty_tags=True, required_tags: set = None):
     all_tags_lists = []
     for csv_file_name in csv_file_names:
-        tags_list = read_tags_from_csv(csv_file_name, add_spoty_tags)
+        tags_list = read_tags_from_csv(csv_file_name, add_spoty_tags, required_tags=required_tags)
         all_tags_lists.extend(tags_list)
 
     return all_tags_lists
 
 
-def read_tags_from_csv(csv_file_name, add_spoty_tags=True, add_missing_tags=True, allow_empty=False):
+def read_tags_from_csv(csv_file_name, add_spoty_tags=True, add_missing_tags=True, allow_empty=False,
+                      required_tags: set = None):
     csv_file_name = os.path.abspath(csv_file_name)
     tags_list = []
 
@@ -224,12 +254,15 @@ def read_tags_from_csv(csv_file_name, add_spoty_tags=True, add_missing_tags=True
             # read header
 
             if (i == 0):
-                header = row
+                header = [spoty.string_pool.get_key(key) for key in row]
                 if len(header) == 0:
                     if allow_empty:
                         return []
                     else:
                         raise CSVFileInvalidHeader()
+                # columns of not required tags are not read
+                columns = [(h, key) for h, key in enumerate(header)
+                           if required_tags is None or key in required_tags]
                 continue
 
             # read tags
@@ -240,9 +273,9 @@ def read_tags_from_csv(csv_file_name, add_spoty_tags=True, add_missing_tags=True
             if all(item == "" for item in row):  # skip empty lines
                 continue
 
-            tags = {}
+            tags = spoty.track.new_tags()
 
-            for h, key in enumerate(header):
+            for h, key in columns:
                 if len(row[h]) > 0:
                     tags[key] = row[h]
 
@@ -256,6 +289,8 @@ def read_tags_from_csv(csv_file_name, add_spoty_tags=True, add_missing_tags=True
             if add_missing_tags:
                 tags = spoty.utils.clean_tags_after_read(tags)
 
+            spoty.string_pool.pool_tags(tags)
+
             tags_list.append(tags)
 
     return tags_list
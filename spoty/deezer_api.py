@@ -3,8 +3,11 @@ from spoty import settings, secrets_file_name
 from deezer import Deezer
 from spoty import log
 import spoty.utils
+import spoty.string_pool
+import spoty.track
 import os.path
 import click
+import contextlib
 import time
 import re
 import datetime
@@ -54,34 +57,59 @@ def get_arl():
         f.write(arl)
 
 
-def get_tracks_from_playlists(playlist_ids: list, add_spoty_tags=True):
+def get_tracks_from_playlists(playlist_ids: list, add_spoty_tags=True, required_tags: set = None,
+                              show_progress=True):
     all_tracks = []
     all_tags_list = []
     all_received_playlists = []
 
+    # progress bar is not shown when other sources are read at the same time
+    if show_progress:
+        bar = click.progressbar(playlist_ids, label=f'Reading tracks in {len(playlist_ids)} Deezer playlists')
+    else:
+        bar = contextlib.nullcontext(playlist_ids)
+
+    with bar as ids:
+        for playlist_id, tracks, tags in iterate_tracks_from_playlists(ids, add_spoty_tags, required_tags):
+            all_tracks.extend(tracks)
+            all_tags_list.extend(tags)
+            all_received_playlists.append(playlist_id)
+
+    return all_tracks, all_tags_list, all_received_playlists
+
+
+def iterate_tracks_from_playlists(playlist_ids, add_spoty_tags=True, required_tags: set = None):
+    # playlist id, tracks and tags are yielded for each playlist as soon as it is received
     requested_playlists = []
 
-    with click.progressbar(playlist_ids, label=f'Reading tracks in {len(playlist_ids)} Deezer playlists') as bar:
-        for playlist_id in bar:
+    for playlist_id in playlist_ids:
 
-            # remove already requested playlists
-            if playlist_id in requested_playlists:
-                click.echo(f'Deezer playlist {playlist_id} requested twice. In will be skipped.')
-                continue
+        # remove already requested playlists
+        if playlist_id in requested_playlists:
+            click.echo(f'Deezer playlist {playlist_id} requested twice. In will be skipped.')
+            continue
 
-            tracks, playlist = get_playlist_with_full_list_of_tracks(playlist_id, add_spoty_tags)
-            requested_playlists.append(playlist_id)
+        tracks, playlist = get_playlist_with_full_list_of_tracks(playlist_id, add_spoty_tags)
+        requested_playlists.append(playlist_id)
 
-            tags = read_tags_from_deezer_tracks(tracks)
+        tags = read_tags_from_deezer_tracks(tracks, required_tags)
 
-            all_tracks.extend(tracks)
-            all_tags_list.extend(tags)
-            all_received_playlists.append(playlist_id)
+        yield playlist_id, tracks, tags
 
-    return all_tracks, all_tags_list, all_received_playlists
+
+def get_tracks_of_deezer_user(user_id: str, playlists_names_regex: str = None, required_tags: set = None,
+                              show_progress=True):
+    ids = get_playlists_ids_of_deezer_user(user_id, playlists_names_regex)
+    if len(ids) == 0:
+        return [], [], []
+
+    tracks, tags, playlists = get_tracks_from_playlists(ids, required_tags=required_tags,
+                                                        show_progress=show_progress)
+
+    return tracks, tags, playlists
 
 
-def get_tracks_of_deezer_user(user_id: str, playlists_names_regex: str = None):
+def get_playlists_ids_of_deezer_user(user_id: str, playlists_names_regex: str = None):
     if user_id == 'me':
         playlists = get_list_of_user_playlists()
         click.echo(f'You have {len(playlists)} playlists in Deezer library')
@@ -92,13 +120,7 @@ def get_tracks_of_deezer_user(user_id: str, playlists_names_regex: str = None):
     if playlists_names_regex is not None:
         playlists = list(filter(lambda pl: re.findall(playlists_names_regex, pl['title']), playlists))
 
-    if len(playlists) == 0:
-        return [], [], []
-
-    ids = get_playlists_ids(playlists)
-    tracks, tags, playlists = get_tracks_from_playlists(ids)
-
-    return tracks, tags, playlists
+    return get_playlists_ids(playlists)
 
 
 def get_track_artist_and_title(track: dict):
@@ -657,18 +679,18 @@ def add_spoty_tags_to_tracks(tracks: list, new_tracks: list, playlist_id: str, p
     return counter
 
 
-def read_tags_from_deezer_tracks(tracks: list):
+def read_tags_from_deezer_tracks(tracks: list, required_tags: set = None):
     tag_tracks = []
 
     for track in tracks:
-        tags = read_tags_from_deezer_track(track)
+        tags = read_tags_from_deezer_track(track, required_tags)
         tag_tracks.append(tags)
 
     return tag_tracks
 
 
-def read_tags_from_deezer_track(track: dict):
-    tags = {}
+def read_tags_from_deezer_track(track: dict, required_tags: set = None):
+    tags = spoty.track.new_tags()
 
     if 'ISRC' in track:
         tags['ISRC'] = track['ISRC']
@@ -721,6 +743,8 @@ def read_tags_from_deezer_track(track: dict):
             tags[tag] = track[tag]
 
     tags = spoty.utils.clean_tags_after_read(tags)
+    tags = spoty.utils.remove_not_required_tags(tags, required_tags)
+    spoty.string_pool.pool_tags(tags)
 
     return tags
 
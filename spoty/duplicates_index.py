@@ -0,0 +1,149 @@
+from spoty import config_path
+from spoty import log
+from spoty.tags_index import COMPARE_LENGTH_TOLERANCE_SEC
+import spoty.utils
+import sqlite3
+import hashlib
+import json
+import os
+
+default_index_file_name = os.path.join(config_path, 'duplicates_index.sqlite')
+
+
+class DuplicatesIndexStats:
+    new_count: int
+    changed_count: int
+    removed_count: int
+    unchanged_count: int
+
+    def __init__(self):
+        self.new_count = 0
+        self.changed_count = 0
+        self.removed_count = 0
+        self.unchanged_count = 0
+
+
+def open_index(file_name: str):
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    db = sqlite3.connect(file_name)
+    db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+    db.execute('CREATE TABLE IF NOT EXISTS tracks (identity TEXT PRIMARY KEY, fingerprint TEXT)')
+    db.execute('CREATE TABLE IF NOT EXISTS matches '
+               '(identity1 TEXT, identity2 TEXT, compare_tags_index INTEGER, PRIMARY KEY (identity1, identity2))')
+    db.execute('CREATE INDEX IF NOT EXISTS matches_identity2 ON matches (identity2)')
+    return db
+
+
+def get_index_config(compare_tags_list: list):
+    return json.dumps({
+        'compare_tags': compare_tags_list,
+        'length_tolerance': COMPARE_LENGTH_TOLERANCE_SEC,
+    })
+
+
+def get_tracks_identities(tags_list: list):
+    # the same track can be listed twice in one playlist, so identities are numbered
+    identities = []
+    counts = {}
+    for tags in tags_list:
+        identity = spoty.utils.get_track_identity(tags)
+        count = counts.get(identity, 0) + 1
+        counts[identity] = count
+        identities.append(identity if count == 1 else f'{identity}#{count}')
+    return identities
+
+
+def get_track_fingerprint(tags: dict, fingerprint_tags: list):
+    values = [(tag, str(tags[tag])) for tag in fingerprint_tags if tag in tags]
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+
+def find_duplicates_incremental(tags_list: list, compare_tags_def_list: list, compare_tags_prob_list: list,
+                                index_file_name: str = None, add_dup_tags=False, jobs: int = None):
+    # matches between tracks are saved to the index file, so only new and changed tracks are compared
+
+    if index_file_name is None:
+        index_file_name = default_index_file_name
+
+    compare_tags_def_list = [tags.split(',') for tags in compare_tags_def_list]
+    compare_tags_prob_list = [tags.split(',') for tags in compare_tags_prob_list]
+    compare_tags_list = compare_tags_def_list + compare_tags_prob_list
+
+    fingerprint_tags = sorted(set(tag for tags_to_compare in compare_tags_list for tag in tags_to_compare))
+    identities = get_tracks_identities(tags_list)
+    fingerprints = [get_track_fingerprint(tags, fingerprint_tags) for tags in tags_list]
+    track_numbers = {identity: i for i, identity in enumerate(identities)}
+
+    stats = DuplicatesIndexStats()
+
+    db = open_index(index_file_name)
+    try:
+        # compare tags changed - all saved matches are invalid
+
+        config = get_index_config(compare_tags_list)
+        row = db.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+        if row is None or row[0] != config:
+            if row is not None:
+                log.debug(f'Duplicates index config changed. Index will be rebuilt: {index_file_name}')
+            db.execute('DELETE FROM tracks')
+            db.execute('DELETE FROM matches')
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('config', ?)", (config,))
+
+        # find new, changed and removed tracks
+
+        saved_fingerprints = dict(db.execute('SELECT identity, fingerprint FROM tracks'))
+
+        outdated = []
+        check_indexes = []
+        for i, identity in enumerate(identities):
+            saved_fingerprint = saved_fingerprints.get(identity)
+            if saved_fingerprint is None:
+                stats.new_count += 1
+                check_indexes.append(i)
+            elif saved_fingerprint != fingerprints[i]:
+                stats.changed_count += 1
+                outdated.append(identity)
+                check_indexes.append(i)
+            else:
+                stats.unchanged_count += 1
+
+        for identity in saved_fingerprints:
+            if identity not in track_numbers:
+                stats.removed_count += 1
+                outdated.append(identity)
+
+        db.executemany('DELETE FROM tracks WHERE identity = ?', [(identity,) for identity in outdated])
+        db.executemany('DELETE FROM matches WHERE identity1 = ?', [(identity,) for identity in outdated])
+        db.executemany('DELETE FROM matches WHERE identity2 = ?', [(identity,) for identity in outdated])
+
+        # find matches of new and changed tracks
+
+        new_matches = {}
+        for i, j, k in spoty.utils.find_tags_matches(tags_list, compare_tags_list, check_indexes, jobs):
+            pair = (i, j) if identities[i] < identities[j] else (j, i)
+            if pair not in new_matches or k < new_matches[pair]:
+                new_matches[pair] = k
+
+        db.executemany('INSERT OR REPLACE INTO tracks (identity, fingerprint) VALUES (?, ?)',
+                       [(identities[i], fingerprints[i]) for i in check_indexes])
+        db.executemany('INSERT OR REPLACE INTO matches (identity1, identity2, compare_tags_index) VALUES (?, ?, ?)',
+                       [(identities[i], identities[j], k) for (i, j), k in new_matches.items()])
+
+        # collect all matches
+
+        matches = []
+        for identity1, identity2, k in db.execute('SELECT identity1, identity2, compare_tags_index FROM matches'):
+            matches.append((track_numbers[identity1], track_numbers[identity2], k))
+
+        db.commit()
+    finally:
+        db.close()
+
+    duplicates_groups, unique_tracks = spoty.utils.make_duplicates_clusters(tags_list, matches,
+                                                                            compare_tags_def_list,
+                                                                            compare_tags_prob_list)
+
+    if add_dup_tags:
+        spoty.utils.add_duplicates_groups_tags(duplicates_groups)
+
+    return duplicates_groups, unique_tracks, stats
@@ -0,0 +1,335 @@
+from spoty.tag_table import TagTable, ValuesPool, MISSING, MISSING_DATE
+from spoty.track import track_fields
+import spoty.utils
+import numpy as np
+import dateutil.parser
+import calendar
+import re
+
+# filter expression examples:
+#   SPOTY_SOURCE == LOCAL and SPOTY_LENGTH > 600
+#   GENRE contains rock or (YEAR >= 1990 and YEAR < 2000)
+#   not ISRC and SPOTY_TRACK_ADDED > "2020-01-01 00:00:00"
+#   ARTIST matches "^the "
+# a tag without comparison checks that the track has the tag.
+# comparisons of the tag which the track doesn't have are false.
+# if the track doesn't have the tag, its allies are checked (YEAR and DATE, TRACK and TRACKNUMBER).
+
+number_tags = \
+    [
+        'SPOTY_LENGTH',
+        'SPOTY_PLAYLIST_INDEX',
+        'YEAR',
+        'TRACK',
+        'TRACKNUMBER',
+        'DISK',
+        'DISKNUMBER',
+        'BPM',
+        'RATING',
+    ]
+
+date_tags = \
+    [
+        'SPOTY_TRACK_ADDED',
+    ]
+
+# spotify and deezer write the release date to YEAR ("2019-05-10"), the year of it is compared
+year_tags = \
+    [
+        'YEAR',
+        'DATE',
+    ]
+
+year_regex = re.compile(r'\s*(\d{4})(?:$|\D)')
+
+# tags which are not in the tag lists of spoty.utils, but are added by readers or have allies
+other_known_tags = \
+    [
+        'COMMENT',
+        'DATE',
+        'TRACKNUMBER',
+        'DISKNUMBER',
+    ]
+
+# other tags are probably misspelled, they are not allowed in the expression
+known_tags = frozenset(spoty.utils.always_read_tags + spoty.utils.main_tags + spoty.utils.additional_tags +
+                       list(spoty.utils.tag_allies_map) + track_fields + number_tags + date_tags + other_known_tags)
+
+compare_operators = ['==', '!=', '<', '<=', '>', '>=']
+text_operators = ['contains', 'matches']
+keywords = ['and', 'or', 'not'] + text_operators
+
+token_regex = re.compile(r'''\s*(?:
+    (?P<number>-?\d+(?:\.\d+)?)(?![^\s()=!<>"'])|
+    (?P<string>"[^"]*"|'[^']*')|
+    (?P<operator>==|!=|<=|>=|<|>|=|\(|\))|
+    (?P<word>[^\s()=!<>"']+)
+    )''', re.VERBOSE)
+
+
+class FilterExpressionError(Exception):
+    """Expression can't be parsed or doesn't match the types of tags."""
+    pass
+
+
+def tokenize(expression: str):
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = token_regex.match(expression, pos)
+        if match is None or match.end() == pos:
+            pos += len(expression[pos:]) - len(expression[pos:].lstrip())  # spaces before the character
+            raise FilterExpressionError(f'Unexpected character at position {pos + 1}.')
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = value[1:-1]
+        elif kind == 'operator' and value == '=':
+            value = '=='
+        elif kind == 'word' and value.lower() in keywords:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+def to_number(value):
+    if type(value) is bool:
+        return None
+    if type(value) in (int, float):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_year(value):
+    number = to_number(value)
+    if number is not None:
+        return number
+    match = year_regex.match(str(value))
+    return float(match.group(1)) if match is not None else None
+
+
+def to_epoch(value: str):
+    try:
+        return calendar.timegm(dateutil.parser.parse(value).utctimetuple())
+    except (ValueError, OverflowError):
+        raise FilterExpressionError(f'Cant parse date: "{value}". Use this format: "2018-06-29 08:15:27"')
+
+
+def compare(left, operator: str, right):
+    if operator == '==':
+        return left == right
+    if operator == '!=':
+        return left != right
+    if operator == '<':
+        return left < right
+    if operator == '<=':
+        return left <= right
+    if operator == '>':
+        return left > right
+    return left >= right
+
+
+class Parser:
+    """Parses tokens of the expression to nodes: ('and', left, right), ('or', left, right), ('not', node),
+    ('has', tag), ('compare', tag, operator, value)."""
+    tokens: list
+    pos: int
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise FilterExpressionError('Unexpected end of expression.')
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise FilterExpressionError(f'Unexpected "{self.tokens[self.pos][1]}".')
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ('keyword', 'or'):
+            self.take()
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() == ('keyword', 'and'):
+            self.take()
+            node = ('and', node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == ('keyword', 'not'):
+            self.take()
+            return ('not', self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, value = self.take()
+        if (kind, value) == ('operator', '('):
+            node = self.parse_or()
+            if self.take() != ('operator', ')'):
+                raise FilterExpressionError('Missing ")".')
+            return node
+        if kind != 'word':
+            raise FilterExpressionError(f'Tag name expected instead of "{value}".')
+
+        tag = value.upper()
+        if tag not in known_tags:
+            raise FilterExpressionError(f'Unknown tag "{tag}".')
+        next_kind, operator = self.peek()
+        if not (next_kind == 'operator' and operator in compare_operators) \
+                and not (next_kind == 'keyword' and operator in text_operators):
+            return ('has', tag)
+        self.take()
+
+        kind, value = self.take()
+        if kind not in ['number', 'string', 'word']:
+            raise FilterExpressionError(f'Value expected after "{tag} {operator}".')
+        return check_types(tag, operator, kind, value)
+
+
+def check_types(tag: str, operator: str, kind: str, value):
+    # values are converted to the type of the tag once, when the expression is compiled
+    if operator in text_operators:
+        if operator == 'matches':
+            try:
+                value = re.compile(value, re.IGNORECASE)
+            except re.error as e:
+                raise FilterExpressionError(f'Invalid regular expression "{value}": {e}')
+        else:
+            value = value.lower()
+        return ('compare', tag, operator, value)
+
+    if tag in date_tags:
+        return ('compare', tag, operator, to_epoch(value))
+
+    # numbers of text tags are compared as text by ==, so ISRC == 12345 is found by the hash of the value
+    if kind == 'number' and (tag in number_tags or operator not in ['==', '!=']):
+        return ('compare', tag, operator, float(value))
+
+    if tag in number_tags:
+        raise FilterExpressionError(f'{tag} can be compared only with a number, not "{value}".')
+    if operator not in ['==', '!=']:
+        raise FilterExpressionError(f'{tag} {operator} "{value}": only numbers can be compared with "{operator}".')
+    return ('compare', tag, operator, value)
+
+
+def get_node_tags(node: tuple):
+    if node[0] in ['and', 'or']:
+        return get_node_tags(node[1]) + get_node_tags(node[2])
+    if node[0] == 'not':
+        return get_node_tags(node[1])
+    return [node[1]]
+
+
+def get_node_mask(node: tuple, table: TagTable):
+    # mask of all table rows
+    kind = node[0]
+    if kind == 'and':
+        return get_node_mask(node[1], table) & get_node_mask(node[2], table)
+    if kind == 'or':
+        return get_node_mask(node[1], table) | get_node_mask(node[2], table)
+    if kind == 'not':
+        return ~get_node_mask(node[1], table)
+    if kind == 'has':
+        return get_tag_mask(table, node[1], lambda tag: table.has_tag(tag))
+
+    tag, operator, value = node[1:]
+    return get_tag_mask(table, tag, lambda tag: get_compare_mask(table, tag, operator, value))
+
+
+def get_tag_mask(table: TagTable, tag: str, get_mask: callable):
+    # rows which don't have the tag are checked by its allies in turn
+    mask = get_mask(tag)
+    missing = ~table.has_tag(tag)
+    for ally in spoty.utils.get_tag_allies(tag, False):
+        if not missing.any():
+            break
+        mask = mask | (missing & get_mask(ally))
+        missing &= ~table.has_tag(ally)
+    return mask
+
+
+def get_compare_mask(table: TagTable, tag: str, operator: str, value):
+    # each distinct value of the tag is checked once
+    if operator == 'contains':
+        return table.values_mask(tag, lambda tag_value: value in str(tag_value).lower())
+    if operator == 'matches':
+        return table.values_mask(tag, lambda tag_value: value.search(str(tag_value)) is not None)
+
+    if tag in date_tags:
+        dates = table.date_column(tag)
+        return (dates != MISSING_DATE) & compare(dates, operator, value)
+
+    if type(value) is float:
+        convert = to_year if tag in year_tags else to_number
+
+        def compare_number(tag_value):
+            number = convert(tag_value)
+            return number is not None and compare(number, operator, value)
+
+        return table.values_mask(tag, compare_number)
+
+    # text equality is found by the codes of the value in the pool, without checking values
+    column = table.column(tag)
+    found = np.isin(column, get_text_codes(table.pool, value))
+    if operator == '==':
+        return found
+    return ~found & (column != MISSING)
+
+
+def get_text_codes(pool: ValuesPool, value: str):
+    # readers keep some values as numbers (deezer ids), they are equal to the value if their text is the same
+    keys = [value]
+    for number_type in (int, float):
+        try:
+            number = number_type(value)
+        except ValueError:
+            continue
+        if str(number) == value:
+            keys.append((number_type, number))
+    return [pool.codes[key] for key in keys if key in pool.codes]
+
+
+class FilterExpression:
+    """Filter expression compiled to the tree of nodes. Masks are made by columns of the tag table."""
+    expression: str
+    node: tuple
+    last_table: TagTable
+    last_mask: np.ndarray
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.node = Parser(tokenize(expression)).parse()
+        self.last_table = None
+        self.last_mask = None
+
+    def get_tags(self):
+        return list(dict.fromkeys(spoty.utils.get_tags_with_allies(get_node_tags(self.node))))
+
+    def get_mask(self, table: TagTable):
+        # the mask of the table is reused when the filter is checked for other rows of the same table
+        if table is not self.last_table:
+            self.last_mask = get_node_mask(self.node, table)
+            self.last_table = table
+        return self.last_mask
+
+    def check(self, table: TagTable, indexes):
+        return self.get_mask(table)[indexes]
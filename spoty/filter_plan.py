@@ -0,0 +1,236 @@
+from spoty.tags_index import NormalizedTagsCache
+import spoty.tag_table
+import spoty.utils
+import numpy as np
+
+SELECTIVITY_SAMPLE_SIZE = 1000  # tracks checked to find which filter removes more tracks
+
+
+class TrackFilter:
+    """Filter which checks each track separately. check(table, indexes) returns bool array of table rows to leave.
+    Summary message is formatted with removed and count."""
+    message: str
+    check: callable
+
+    def __init__(self, message: str, check: callable):
+        self.message = message
+        self.check = check
+
+
+class DuplicatesFilter:
+    """Filter which removes duplicates (or leaves only duplicates) by each of compare tags lists.
+    Tracks can be fed in parts, duplicates are also found among the tracks of the previous parts."""
+    compare_tags_list: list
+    leave: bool
+    tags_sets: list
+    duplicates: list
+    checked_counts: list
+    found_counts: list
+
+    def __init__(self, compare_tags_list: list, leave=False):
+        self.compare_tags_list = compare_tags_list
+        self.leave = leave
+        cache = NormalizedTagsCache()
+        self.tags_sets = [spoty.utils.TagsSet(compare_tags_str.split(','), False, cache)
+                          for compare_tags_str in compare_tags_list]
+        self.duplicates = [[] for compare_tags_str in compare_tags_list]
+        self.checked_counts = [0] * len(compare_tags_list)
+        self.found_counts = [0] * len(compare_tags_list)
+
+    def feed(self, tags_list: list):
+        # one pass for all compare tags. the track is checked by the next compare tags only if it is not
+        # a duplicate by the previous ones, so the result is the same as removing duplicates by each in turn
+        good = []
+        for tags in tags_list:
+            for k, tags_set in enumerate(self.tags_sets):
+                self.checked_counts[k] += 1
+                if tags_set.has_match(tags):
+                    self.found_counts[k] += 1
+                    if self.leave:
+                        self.duplicates[k].append(tags)
+                    break
+                tags_set.add(tags)
+            else:
+                good.append(tags)
+
+        # duplicates are left grouped by compare tags, so they are known only after all tracks
+        return [] if self.leave else good
+
+    def finish(self):
+        if self.leave:
+            return [tags for dup in self.duplicates for tags in dup]
+        return []
+
+    def get_summary(self):
+        summary = []
+        for compare_tags_str, found, count in zip(self.compare_tags_list, self.found_counts, self.checked_counts):
+            if found > 0:
+                if self.leave:
+                    summary.append(f'   {found}/{count} tracks left (duplicates by tags: {compare_tags_str})')
+                else:
+                    summary.append(f'  {found}/{count} tracks removed (duplicates by tags: {compare_tags_str})')
+        return summary
+
+
+def have_all_tags_filter(tags_to_check: list):
+    return TrackFilter('  {removed}/{count} tracks removed (have all of the specified tags).',
+                       lambda table, indexes: table.has_all_tags(tags_to_check)[indexes])
+
+
+def have_no_tags_filter(tags_to_check: list):
+    return TrackFilter('  {removed}/{count} tracks removed (not have any of the specified tags).',
+                       lambda table, indexes: ~table.has_all_tags(tags_to_check)[indexes])
+
+
+def added_between_filter(message: str, after: int = None, before: int = None):
+    # dates are compared as epoch seconds, tracks without the date are removed
+    def check(table: spoty.tag_table.TagTable, indexes):
+        dates = table.date_column('SPOTY_TRACK_ADDED')[indexes]
+        mask = dates != spoty.tag_table.MISSING_DATE
+        if after is not None:
+            mask &= dates > after
+        if before is not None:
+            mask &= dates < before
+        return mask
+
+    return TrackFilter(message, check)
+
+
+class TrackFiltersStage:
+    """Track filters which are next to each other in the plan. They are run together in one pass."""
+    track_filters: list
+    count: int
+    removed_counts: list
+
+    def __init__(self, track_filters: list):
+        self.track_filters = track_filters
+        self.count = 0
+        self.removed_counts = [0] * len(track_filters)
+
+    def feed(self, tags_list: list):
+        self.count += len(tags_list)
+        tags_list, removed_counts = run_track_filters(self.track_filters, tags_list)
+        for i, removed_count in enumerate(removed_counts):
+            self.removed_counts[i] += removed_count
+        return tags_list
+
+    def finish(self):
+        return []
+
+    def get_summary(self):
+        summary = []
+        count = self.count
+        for track_filter, removed_count in zip(self.track_filters, self.removed_counts):
+            if removed_count != 0:
+                summary.append(track_filter.message.format(removed=removed_count, count=count))
+            count -= removed_count
+        return summary
+
+
+class FilterPlan:
+    """Filters of the filter command in their order.
+    Track filters between duplicates filters are run together in one pass."""
+    filters: list
+
+    def __init__(self):
+        self.filters = []
+
+    def add(self, track_filter):
+        self.filters.append(track_filter)
+
+    def make_stages(self):
+        stages = []
+        track_filters = []
+        for track_filter in self.filters + [None]:
+            if isinstance(track_filter, TrackFilter):
+                track_filters.append(track_filter)
+                continue
+
+            # duplicates depend on the tracks left by the previous filters
+            if len(track_filters) > 0:
+                stages.append(TrackFiltersStage(track_filters))
+                track_filters = []
+            if track_filter is not None:
+                stages.append(track_filter)
+        return stages
+
+    def run(self, tags_list: list):
+        stages = self.make_stages()
+        tags_list = feed_stages(stages, tags_list) + finish_stages(stages)
+        return tags_list, get_stages_summary(stages)
+
+    def stream(self, tags_lists, on_finish: callable):
+        # tracks are filtered by the parts in which they are received.
+        # filters which need all tracks keep them until the end. on_finish is called with the summary
+        stages = self.make_stages()
+        for tags_list in tags_lists:
+            tags_list = feed_stages(stages, tags_list)
+            if len(tags_list) > 0:
+                yield tags_list
+
+        tags_list = finish_stages(stages)
+        if len(tags_list) > 0:
+            yield tags_list
+        on_finish(get_stages_summary(stages))
+
+
+def feed_stages(stages: list, tags_list: list):
+    for stage in stages:
+        tags_list = stage.feed(tags_list)
+    return tags_list
+
+
+def finish_stages(stages: list):
+    # tracks kept by the stage until the end pass through the next stages
+    tags_list = []
+    for stage in stages:
+        tags_list = stage.feed(tags_list) + stage.finish()
+    return tags_list
+
+
+def get_stages_summary(stages: list):
+    return [line for stage in stages for line in stage.get_summary()]
+
+
+def estimate_leave_rate(track_filter: TrackFilter, table: spoty.tag_table.TagTable):
+    step = max(1, len(table) // SELECTIVITY_SAMPLE_SIZE)
+    return track_filter.check(table, np.arange(0, len(table), step)).mean()
+
+
+def run_track_filters(track_filters: list, tags_list: list):
+    # the filter which leaves less tracks checks them first, next filters check only the tracks left.
+    # returns tracks left and the count of tracks removed by each filter
+    count = len(tags_list)
+    if count == 0:
+        return tags_list, [0] * len(track_filters)
+
+    table = spoty.tag_table.TagTable(tags_list)
+    if len(track_filters) > 1:
+        order = sorted(range(len(track_filters)), key=lambda i: estimate_leave_rate(track_filters[i], table))
+    else:
+        order = [0]
+
+    left = np.arange(count)
+    removed_by = {}
+    for i in order:
+        passed = track_filters[i].check(table, left)
+        removed_by[i] = left[~passed]
+        left = left[passed]
+
+    # summary shows tracks removed by each filter in the order of options,
+    # so removed tracks are also checked by the previous filters which were run later
+
+    removed_counts = [0] * len(track_filters)
+    for pos, i in enumerate(order):
+        removed = removed_by[i]
+        for j in range(i):
+            if len(removed) == 0:
+                break
+            if j in order[:pos]:
+                continue  # the track passed this filter
+            passed = track_filters[j].check(table, removed)
+            removed_counts[j] += int((~passed).sum())
+            removed = removed[passed]
+        removed_counts[i] += len(removed)
+
+    return [tags_list[r] for r in left.tolist()], removed_counts
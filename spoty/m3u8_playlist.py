@@ -119,16 +119,18 @@ def write_tags_to_m3u8(tags_list, m3u8_file_name, append=False):
         file.writelines(files)
 
 
-def read_tags_from_m3u8s(m3u8_file_names, add_spoty_tags=True, clean_tags=True):
+def read_tags_from_m3u8s(m3u8_file_names, add_spoty_tags=True, clean_tags=True, required_tags: set = None,
+                         jobs: int = None):
     all_tags_lists = []
     for m3u8_file_name in m3u8_file_names:
-        tags_list = read_tags_from_m3u8(m3u8_file_name, add_spoty_tags, clean_tags)
+        tags_list = read_tags_from_m3u8(m3u8_file_name, add_spoty_tags, clean_tags, required_tags, jobs)
         all_tags_lists.extend(tags_list)
 
     return all_tags_lists
 
 
-def read_tags_from_m3u8(m3u8_file_name, add_spoty_tags=True, clean_tags=True):
+def read_tags_from_m3u8(m3u8_file_name, add_spoty_tags=True, clean_tags=True, required_tags: set = None,
+                        jobs: int = None):
     m3u8_file_name = os.path.abspath(m3u8_file_name)
 
     with open(m3u8_file_name, newline='', encoding='utf-8-sig') as file:
@@ -136,7 +138,7 @@ def read_tags_from_m3u8(m3u8_file_name, add_spoty_tags=True, clean_tags=True):
         for i, f in enumerate(files_list):
             files_list[i] = f.rstrip("\n").strip()
 
-    tags_list = spoty.audio_files.read_audio_files_tags(files_list, add_spoty_tags, clean_tags)
+    tags_list = spoty.audio_files.read_audio_files_tags(files_list, add_spoty_tags, clean_tags, required_tags, jobs)
 
     if add_spoty_tags:
         for i, tags in enumerate(tags_list):
@@ -0,0 +1,146 @@
+from array import array
+import numpy as np
+import random
+import zlib
+
+NGRAM_SIZE = 3  # characters in one shingle
+PERMUTATIONS_COUNT = 64  # length of MinHash signature
+MAX_HASH = (1 << 32) - 5  # prime, hashes of permutations are less than it
+MAX_MULTIPLIER = 1 << 31  # a * shingle + b of permutations must fit in uint64
+
+similarity_tags = \
+    [
+        'ARTIST',
+        'TITLE',
+    ]
+
+
+def get_similarity_text(tags: dict):
+    # artists order and separators don't matter, punctuation and case are ignored
+    artists = tags['ARTIST'].replace(',', ';').split(';')
+    artists = sorted(set(' '.join(artist.lower().split()) for artist in artists))
+    text = ' '.join(artists) + ' ' + tags['TITLE'].lower()
+    text = ''.join(char if char.isalnum() else ' ' for char in text)
+    return ' '.join(text.split())
+
+
+def get_shingles(text: str):
+    # tracks without any letters or digits in artist and title are not similar to anything
+    if len(text) == 0:
+        return set()
+    if len(text) < NGRAM_SIZE:
+        return {zlib.crc32(text.encode('utf-8'))}
+    return set(zlib.crc32(text[i:i + NGRAM_SIZE].encode('utf-8')) for i in range(len(text) - NGRAM_SIZE + 1))
+
+
+def get_similarity(shingles1, shingles2):
+    # Jaccard similarity of shingle sets
+    shingles1 = set(shingles1)
+    intersection = len(shingles1.intersection(shingles2))
+    return intersection / (len(shingles1) + len(shingles2) - intersection)
+
+
+def get_lsh_bands(threshold: float, permutations_count: int):
+    # tracks are candidates if all rows of any band are equal, the probability is 1 - (1 - s^rows)^bands.
+    # it is 50% near (1 / bands) ^ (1 / rows), which is chosen just below the threshold to find most of similar tracks
+    best = None
+    for rows in range(1, permutations_count + 1):
+        bands = permutations_count // rows
+        lsh_threshold = (1 / bands) ** (1 / rows)
+        if lsh_threshold > threshold * 0.9:
+            break
+        best = (bands, rows)
+    if best is None:
+        best = (permutations_count, 1)
+    return best
+
+
+class MinHashIndex:
+    """Tracks indexed by MinHash signatures of ARTIST and TITLE. Finds tracks with similar artist and title."""
+    threshold: float
+    bands: int
+    rows: int
+    multipliers: np.ndarray
+    offsets: np.ndarray
+    buckets: list
+    shingles: dict
+    last_tags: dict
+    last_keys: tuple
+
+    def __init__(self, threshold: float):
+        if not 0 < threshold <= 1:
+            raise ValueError(f'Similarity threshold must be greater than 0 and not greater than 1: {threshold}')
+        self.threshold = threshold
+        self.bands, self.rows = get_lsh_bands(threshold, PERMUTATIONS_COUNT)
+
+        rnd = random.Random(1)  # the same permutations in every run
+        count = self.bands * self.rows
+        self.multipliers = np.array([[rnd.randrange(1, MAX_MULTIPLIER)] for i in range(count)], dtype=np.uint64)
+        self.offsets = np.array([[rnd.randrange(0, MAX_HASH)] for i in range(count)], dtype=np.uint64)
+
+        self.buckets = [{} for i in range(self.bands)]
+        self.shingles = {}
+        self.last_tags = None
+        self.last_keys = None
+
+    def get_signature(self, shingles: set):
+        # hashes of all shingles by all permutations at once, the minimal hash of each permutation
+        shingles = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        return ((self.multipliers * shingles + self.offsets) % np.uint64(MAX_HASH)).min(axis=1)
+
+    def get_keys(self, tags: dict):
+        # track is usually searched and then added, so the last signature is reused
+        if tags is self.last_tags:
+            return self.last_keys
+
+        shingles = get_shingles(get_similarity_text(tags))
+        if len(shingles) > 0:
+            signature = self.get_signature(shingles)
+            band_keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+        else:
+            band_keys = None
+
+        self.last_tags = tags
+        self.last_keys = (shingles, band_keys)
+        return self.last_keys
+
+    def add(self, tags: dict, item: int):
+        for tag in similarity_tags:
+            if tag not in tags:
+                return
+
+        shingles, band_keys = self.get_keys(tags)
+        if band_keys is None:
+            return
+        self.shingles[item] = array('I', sorted(shingles))
+        for band, key in enumerate(band_keys):
+            bucket = self.buckets[band].get(key)
+            if bucket is None:
+                self.buckets[band][key] = [item]
+            else:
+                bucket.append(item)
+
+    def find(self, tags: dict):
+        # returns list of (similarity, item), most similar first
+
+        for tag in similarity_tags:
+            if tag not in tags:
+                return []
+
+        shingles, band_keys = self.get_keys(tags)
+        if band_keys is None:
+            return []
+
+        candidates = set()
+        for band, key in enumerate(band_keys):
+            bucket = self.buckets[band].get(key)
+            if bucket is not None:
+                candidates.update(bucket)
+
+        found = []
+        for item in candidates:
+            similarity = get_similarity(self.shingles[item], shingles)
+            if similarity >= self.threshold:
+                found.append((similarity, item))
+        found.sort(key=lambda x: (-x[0], x[1]))
+        return found
@@ -1,8 +1,11 @@
 from spoty import log
 import spoty.utils
 import spoty.csv_playlist
+import spoty.string_pool
+import spoty.track
 import os.path
 import click
+import contextlib
 import time
 import re
 from spoty import settings, config_path, secrets_file_name
@@ -40,44 +43,70 @@ def get_sp():
     return sp
 
 
-def get_tracks_from_playlists(playlist_ids: list, add_spoty_tags=True):
+def get_tracks_from_playlists(playlist_ids: list, add_spoty_tags=True, required_tags: set = None,
+                              show_progress=True):
     if len(playlist_ids) == 0:
         return [], [], []
 
     all_tracks = []
     all_tags_list = []
     all_received_playlist_ids = []
+
+    # progress bar is not shown when other sources are read at the same time
+    if show_progress:
+        bar = click.progressbar(playlist_ids, label=f'Reading tracks in {len(playlist_ids)} Spotify playlists')
+    else:
+        bar = contextlib.nullcontext(playlist_ids)
+
+    with bar as ids:
+        for playlist_id, tracks, tags in iterate_tracks_from_playlists(ids, add_spoty_tags, required_tags):
+            all_tracks.extend(tracks)
+            all_tags_list.extend(tags)
+            all_received_playlist_ids.append(playlist_id)
+
+    return all_tracks, all_tags_list, all_received_playlist_ids
+
+
+def iterate_tracks_from_playlists(playlist_ids, add_spoty_tags=True, required_tags: set = None):
+    # playlist id, tracks and tags are yielded for each playlist as soon as it is received
     requested_playlists = []
 
-    with click.progressbar(playlist_ids, label=f'Reading tracks in {len(playlist_ids)} Spotify playlists') as bar:
-        for playlist_id in bar:
+    for playlist_id in playlist_ids:
 
-            # remove already requested playlists
-            if playlist_id in requested_playlists:
-                click.echo(f'\nSpotify playlist {playlist_id} requested twice. In will be skipped.')
-                continue
+        # remove already requested playlists
+        if playlist_id in requested_playlists:
+            click.echo(f'\nSpotify playlist {playlist_id} requested twice. In will be skipped.')
+            continue
 
-            playlist = get_playlist_with_full_list_of_tracks(playlist_id, add_spoty_tags)
-            if playlist is None:
-                # click.echo(f"\nPlaylist id {playlist_id} not found.")
-                continue
-            requested_playlists.append(playlist_id)
+        playlist = get_playlist_with_full_list_of_tracks(playlist_id, add_spoty_tags)
+        if playlist is None:
+            # click.echo(f"\nPlaylist id {playlist_id} not found.")
+            continue
+        requested_playlists.append(playlist_id)
 
-            if 'tracks' not in playlist or 'items' not in playlist['tracks']:
-                continue
+        if 'tracks' not in playlist or 'items' not in playlist['tracks']:
+            continue
 
-            tracks = playlist['tracks']['items']
+        tracks = playlist['tracks']['items']
 
-            tags = read_tags_from_spotify_tracks(tracks)
+        tags = read_tags_from_spotify_tracks(tracks, required_tags)
 
-            all_tracks.extend(tracks)
-            all_tags_list.extend(tags)
-            all_received_playlist_ids.append(playlist_id)
+        yield playlist_id, tracks, tags
 
-    return all_tracks, all_tags_list, all_received_playlist_ids
 
+def get_tracks_of_spotify_user(user_id: str, playlists_names_regex: str = None, required_tags: set = None,
+                               show_progress=True):
+    ids = get_playlists_ids_of_spotify_user(user_id, playlists_names_regex)
+    if len(ids) == 0:
+        return [], [], []
+
+    tracks, tags, playlists = get_tracks_from_playlists(ids, required_tags=required_tags,
+                                                        show_progress=show_progress)
+
+    return tracks, tags, playlists
 
-def get_tracks_of_spotify_user(user_id: str, playlists_names_regex: str = None):
+
+def get_playlists_ids_of_spotify_user(user_id: str, playlists_names_regex: str = None):
     user_id = parse_user_id(user_id)
     if user_id == 'me':
         playlists = get_list_of_playlists()
@@ -89,13 +118,7 @@ def get_tracks_of_spotify_user(user_id: str, playlists_names_regex: str = None):
     if playlists_names_regex is not None:
         playlists = list(filter(lambda pl: re.findall(playlists_names_regex, pl['name']), playlists))
 
-    if len(playlists) == 0:
-        return [], [], []
-
-    ids = get_playlists_ids(playlists)
-    tracks, tags, playlists = get_tracks_from_playlists(ids)
-
-    return tracks, tags, playlists
+    return get_playlists_ids(playlists)
 
 
 def find_track_by_isrc(isrc: str, length=None, length_tolerance=settings.SPOTY.COMPARE_LENGTH_TOLERANCE_SEC):
@@ -1041,23 +1064,23 @@ def parse_user_id(id_or_uri: str):
     return id_or_uri
 
 
-def read_tags_from_spotify_tracks(tracks: list):
+def read_tags_from_spotify_tracks(tracks: list, required_tags: set = None):
     tag_tracks = []
 
     for track in tracks:
-        tags = read_tags_from_spotify_track(track)
+        tags = read_tags_from_spotify_track(track, required_tags)
         tag_tracks.append(tags)
 
     return tag_tracks
 
 
-def read_tags_from_spotify_track(track: dict):
+def read_tags_from_spotify_track(track: dict, required_tags: set = None):
     date_added = track['added_at'] if "added_at" in track else None
 
     if "track" in track:
         track = track['track']
 
-    tags = {}
+    tags = spoty.track.new_tags()
 
     try:
         tags['ISRC'] = track['external_ids']['isrc']
@@ -1110,5 +1133,7 @@ def read_tags_from_spotify_track(track: dict):
             tags[tag] = track[tag]
 
     tags = spoty.utils.clean_tags_after_read(tags)
+    tags = spoty.utils.remove_not_required_tags(tags, required_tags)
+    spoty.string_pool.pool_tags(tags)
 
     return tags
@@ -0,0 +1,88 @@
+import sys
+import threading
+from contextlib import contextmanager
+
+# tags which values repeat in many tracks of a library, one string is kept for each value
+pooled_tags = \
+    [
+        'SPOTY_SOURCE',
+        'SPOTY_PLAYLIST_NAME',
+        'SPOTY_PLAYLIST_ID',
+        'SPOTY_LENGTH',
+        'ARTIST',
+        'ALBUMARTIST',
+        'ALBUM',
+        'GENRE',
+        'YEAR',
+        'DATE',
+        'TRACK',
+        'TRACKNUMBER',
+        'DISKNUMBER',
+        'LABEL',
+        'PUBLISHER',
+        'COMPOSER',
+        'SPOTIFY_ALBUM_ID',
+        'DEEZER_ALBUM_ID',
+        'DEEZER_ARTIST_ID',
+    ]
+
+
+class StringPool:
+    """Shared strings of repeated tag values. Tracks read by all readers refer to the same string objects."""
+    strings: dict
+    reused_count: int
+    saved_bytes: int
+    lock: threading.Lock
+
+    def __init__(self):
+        self.strings = {}
+        self.reused_count = 0
+        self.saved_bytes = 0
+        self.lock = threading.Lock()  # sources can be read in several threads (see get_tracks_wrapper)
+
+    def get(self, value):
+        if type(value) is not str:
+            return value
+        pooled = self.strings.get(value)
+        if pooled is None:
+            # setdefault keeps the string added by another thread in the meantime
+            pooled = self.strings.setdefault(value, value)
+        if pooled is not value:
+            with self.lock:
+                self.reused_count += 1
+                self.saved_bytes += sys.getsizeof(value)
+        return pooled
+
+    def pool_tags(self, tags: dict):
+        for tag in pooled_tags:
+            if tag in tags:
+                tags[tag] = self.get(tags[tag])
+        return tags
+
+
+def get_key(key: str):
+    # tag names are few, so they are interned for the whole run
+    return sys.intern(key)
+
+
+# pool of tracks which are being read now (see pooling). Values are not pooled without it
+pool = None
+
+
+@contextmanager
+def pooling():
+    # strings are pooled only while tracks are read, then the pool is released.
+    # shared values are kept by tracks as long as the tracks are kept
+    global pool
+    previous_pool = pool
+    pool = StringPool()
+    try:
+        yield pool
+    finally:
+        pool = previous_pool
+
+
+def pool_tags(tags: dict):
+    if pool is not None:
+        pool.pool_tags(tags)
+    return tags
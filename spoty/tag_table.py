@@ -0,0 +1,120 @@
+import numpy as np
+import dateutil.parser
+import calendar
+
+MISSING = -1  # code of the tag which the track doesn't have
+MISSING_DATE = np.iinfo(np.int64).min  # epoch of the date tag which the track doesn't have
+
+
+def get_dates_epochs(rows: list, tag: str):
+    # epoch seconds of dates in ISO format ("2018-06-29 08:15:27"), all dates are parsed by numpy at once.
+    # missing dates are parsed as NaT, which is the minimal int64 value
+    values = [tags[tag] if tag in tags else 'NaT' for tags in rows]
+    try:
+        dates = np.array(values, dtype='datetime64[s]')
+    except ValueError:
+        # some dates are not in ISO format, they are parsed one by one
+        dates = np.array([get_date_epoch(value) for value in values], dtype=np.int64)
+        return dates
+    return dates.astype(np.int64)
+
+
+def get_date_epoch(value):
+    # dates which can't be parsed are missing
+    try:
+        return np.datetime64(value, 's').astype(np.int64)
+    except ValueError:
+        pass
+    try:
+        return calendar.timegm(dateutil.parser.parse(str(value)).utctimetuple())
+    except (ValueError, OverflowError):
+        return MISSING_DATE
+
+
+class ValuesPool:
+    """Distinct tag values. Each value is stored once, columns keep codes of values."""
+    values: list
+    codes: dict
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value) -> int:
+        # True and 1 are equal keys of dict, so not string values are stored with their type
+        key = value if type(value) is str else (type(value), value)
+        code = self.codes.get(key)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[key] = code
+        return code
+
+
+class TagTable:
+    """Tags of tracks list stored by columns. Columns are made on first use.
+    Filters are boolean masks of rows, tracks are taken from the list only for the result."""
+    rows: list
+    pool: ValuesPool
+    columns: dict
+    date_columns: dict
+
+    def __init__(self, rows: list, pool: ValuesPool = None):
+        self.rows = rows
+        self.pool = pool if pool is not None else ValuesPool()
+        self.columns = {}
+        self.date_columns = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def all(self):
+        return np.ones(len(self.rows), dtype=bool)
+
+    def column(self, tag: str):
+        column = self.columns.get(tag)
+        if column is None:
+            encode = self.pool.encode
+            column = np.fromiter((encode(tags[tag]) if tag in tags else MISSING for tags in self.rows),
+                                 dtype=np.int32, count=len(self.rows))
+            self.columns[tag] = column
+        return column
+
+    def date_column(self, tag: str):
+        column = self.date_columns.get(tag)
+        if column is None:
+            column = get_dates_epochs(self.rows, tag)
+            self.date_columns[tag] = column
+        return column
+
+    def has_tag(self, tag: str):
+        return self.column(tag) != MISSING
+
+    def values_mask(self, tag: str, check: callable):
+        # check is called once for each distinct value of the tag, rows without the tag are False
+        column = self.column(tag)
+        values = self.pool.values
+        results = np.zeros(len(values) + 1, dtype=bool)  # the last item is taken by MISSING code
+        for code in np.unique(column).tolist():
+            if code != MISSING:
+                results[code] = check(values[code])
+        return results[column]
+
+    def has_all_tags(self, tags: list):
+        mask = self.all()
+        for tag in tags:
+            mask &= self.has_tag(tag)
+        return mask
+
+    def project(self, mask, tags: list):
+        # new tracks with specified tags only, values are taken from columns
+        indexes = np.flatnonzero(mask)
+        columns = [(tag, self.column(tag)[indexes]) for tag in tags]
+        values = self.pool.values
+
+        new_rows = [{} for i in indexes]
+        for tag, column in columns:
+            for new_tags, code in zip(new_rows, column.tolist()):
+                if code != MISSING:
+                    new_tags[tag] = values[code]
+        return new_rows
@@ -0,0 +1,292 @@
+from spoty import settings
+import bisect
+
+COMPARE_LENGTH_TOLERANCE_SEC = int(settings.SPOTY.COMPARE_LENGTH_TOLERANCE_SEC)
+
+normalized_compare_tags = \
+    [
+        'ARTIST',
+        'TITLE',
+        'ALBUM',
+        'ISRC',
+        'SPOTY_LENGTH',
+    ]
+
+prefix_compare_tags = \
+    [
+        'TITLE',
+        'ALBUM',
+    ]
+
+max_prefix_char = chr(0x10FFFF)  # not a character, greater than any char in tag values
+
+not_hashable_compare_tags = \
+    [
+        'TITLE',  # compared by prefix
+        'ALBUM',  # compared by prefix
+        'SPOTY_LENGTH',  # compared with tolerance
+    ]
+
+
+def normalize_tag_value(tag: str, value):
+    if tag == 'ARTIST':
+        artists = value.replace(',', ';').upper()
+        return frozenset(artists.split(';'))
+
+    if tag == 'TITLE':
+        return ''.join(char for char in value.upper() if char.isalnum())
+
+    if tag == 'ALBUM':
+        return value.upper()
+
+    if tag == 'ISRC':
+        return value.upper().replace('-', '')
+
+    if tag == 'SPOTY_LENGTH':
+        return int(value)
+
+    return value
+
+
+class NormalizedTagsCache:
+    """Normalized values of compare tags, calculated once per track."""
+    cache: dict
+
+    def __init__(self):
+        self.cache = {}
+
+    def __getstate__(self):
+        # cached values are bound to ids of tracks, which are not valid in other process
+        return {'cache': {}}
+
+    def get(self, tags: dict) -> dict:
+        # the track is stored with its normalized values, so its id can't be reused while cache is alive
+        entry = self.cache.get(id(tags))
+        if entry is None or entry[0] is not tags:
+            entry = (tags, {})
+            self.cache[id(tags)] = entry
+        return entry[1]
+
+    def get_value(self, tags: dict, tag: str):
+        if tag not in normalized_compare_tags:
+            return tags[tag]
+        normalized = self.get(tags)
+        value = normalized.get(tag)
+        if value is None:
+            value = normalize_tag_value(tag, tags[tag])
+            normalized[tag] = value
+        return value
+
+
+def is_exact_compare_tags(tags_to_compare: list):
+    # all tags are equal only if their (normalized) values are equal, so tracks can be found by key
+    for tag in tags_to_compare:
+        if tag in not_hashable_compare_tags or tag == 'ARTIST':
+            return False
+    return True
+
+
+def get_exact_key(tags: dict, tags_to_compare: list, cache: NormalizedTagsCache):
+    key = []
+    for tag in tags_to_compare:
+        if tag not in tags:
+            return None
+        key.append(cache.get_value(tags, tag))
+    return tuple(key)
+
+
+def get_index_key_values(tags: dict, tag: str, cache: NormalizedTagsCache):
+    value = cache.get_value(tags, tag)
+    if tag == 'ARTIST':
+        return value
+    return [value]
+
+
+def get_index_keys(tags: dict, key_tags: list, cache: NormalizedTagsCache):
+    keys = [()]
+    for tag in key_tags:
+        values = get_index_key_values(tags, tag, cache)
+        keys = [key + (value,) for key in keys for value in values]
+    return keys
+
+
+class LengthIndex:
+    """Items sorted by SPOTY_LENGTH. Allows to find items with length tolerance by binary search."""
+    lengths: list
+    items: list
+
+    def __init__(self):
+        self.lengths = []
+        self.items = []
+
+    def add(self, length: int, item):
+        i = bisect.bisect_right(self.lengths, length)
+        self.lengths.insert(i, length)
+        self.items.insert(i, item)
+
+    def find(self, length: int, tolerance: int):
+        start = bisect.bisect_left(self.lengths, length - tolerance)
+        end = bisect.bisect_right(self.lengths, length + tolerance, start)
+        return self.items[start:end]
+
+
+class SortedValues:
+    """Sorted list of distinct values, split to chunks so that inserts don't move the whole list."""
+    chunk_size = 1000
+    chunks: list
+    maxes: list
+
+    def __init__(self):
+        self.chunks = []
+        self.maxes = []
+
+    def add(self, value):
+        if len(self.chunks) == 0:
+            self.chunks.append([value])
+            self.maxes.append(value)
+            return
+
+        i = bisect.bisect_left(self.maxes, value)
+        if i == len(self.chunks):
+            i -= 1
+            chunk = self.chunks[i]
+            chunk.append(value)
+            self.maxes[i] = value
+        else:
+            chunk = self.chunks[i]
+            bisect.insort(chunk, value)
+
+        if len(chunk) > self.chunk_size * 2:
+            half = len(chunk) // 2
+            self.chunks[i:i + 1] = [chunk[:half], chunk[half:]]
+            self.maxes[i:i + 1] = [chunk[half - 1], chunk[-1]]
+
+    def find_range(self, start, end):
+        # values from start (inclusive) to end (exclusive)
+        i = bisect.bisect_left(self.maxes, start)
+        pos = bisect.bisect_left(self.chunks[i], start) if i < len(self.chunks) else 0
+        while i < len(self.chunks):
+            chunk = self.chunks[i]
+            for value in chunk[pos:] if pos > 0 else chunk:
+                if value >= end:
+                    return
+                yield value
+            i += 1
+            pos = 0
+
+
+class PrefixIndex:
+    """Items by normalized TITLE or ALBUM. Finds items whose value is a prefix of the searched value or vice versa."""
+    items: dict
+    values: SortedValues
+
+    def __init__(self):
+        self.items = {}
+        self.values = SortedValues()
+
+    def add(self, value: str, item):
+        items = self.items.get(value)
+        if items is None:
+            items = []
+            self.items[value] = items
+            self.values.add(value)
+        items.append(item)
+
+    def find(self, value: str):
+        found = []
+
+        # shorter values which are a prefix of the searched value
+        for i in range(len(value)):
+            items = self.items.get(value[:i])
+            if items is not None:
+                found.extend(items)
+
+        # the same value and longer values starting with it
+        for v in self.values.find_range(value, value + max_prefix_char):
+            found.extend(self.items[v])
+
+        return found
+
+
+class TagsIndex:
+    """Hash index of tracks by one set of compare tags. Found candidates must be checked with compare_tags."""
+    tags_to_compare: list
+    key_tags: list
+    bucket_tag: str
+    buckets: dict
+    cache: NormalizedTagsCache
+
+    def __init__(self, tags_to_compare: list, cache: NormalizedTagsCache = None):
+        self.tags_to_compare = tags_to_compare
+        self.cache = cache if cache is not None else NormalizedTagsCache()
+        self.key_tags = [tag for tag in tags_to_compare if tag not in not_hashable_compare_tags]
+
+        # tracks in buckets are indexed by the most selective of not hashable tags
+        self.bucket_tag = None
+        for tag in tags_to_compare:
+            if tag in prefix_compare_tags:
+                self.bucket_tag = tag
+                break
+        if self.bucket_tag is None and 'SPOTY_LENGTH' in tags_to_compare:
+            self.bucket_tag = 'SPOTY_LENGTH'
+
+        self.buckets = {}
+
+    def has_all_tags(self, tags: dict):
+        for tag in self.tags_to_compare:
+            if tag not in tags:
+                return False
+        return True
+
+    def get_keys(self, tags: dict):
+        if len(self.key_tags) == 0:
+            return [()]  # all tracks in one bucket
+        return set(get_index_keys(tags, self.key_tags, self.cache))
+
+    def new_bucket(self):
+        if self.bucket_tag is None:
+            return []
+        if self.bucket_tag == 'SPOTY_LENGTH':
+            return LengthIndex()
+        return PrefixIndex()
+
+    def add(self, tags: dict, item):
+        if not self.has_all_tags(tags):
+            return
+
+        for key in self.get_keys(tags):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.new_bucket()
+                self.buckets[key] = bucket
+            if self.bucket_tag is None:
+                bucket.append(item)
+            else:
+                bucket.add(self.cache.get_value(tags, self.bucket_tag), item)
+
+    def find(self, tags: dict):
+        if not self.has_all_tags(tags):
+            return []
+
+        value = self.cache.get_value(tags, self.bucket_tag) if self.bucket_tag is not None else None
+
+        found_in_buckets = []
+        for key in self.get_keys(tags):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                continue
+            if self.bucket_tag == 'SPOTY_LENGTH':
+                bucket = bucket.find(value, COMPARE_LENGTH_TOLERANCE_SEC)
+            elif self.bucket_tag is not None:
+                bucket = bucket.find(value)
+            found_in_buckets.append(bucket)
+
+        if len(found_in_buckets) == 0:
+            return []
+        if len(found_in_buckets) == 1:
+            return found_in_buckets[0]
+
+        candidates = set()
+        for bucket in found_in_buckets:
+            candidates.update(bucket)
+        return list(candidates)
@@ -0,0 +1,154 @@
+from spoty import settings
+from collections.abc import MutableMapping
+
+# tags which most of tracks have, they are stored in slots of the track.
+# keys of the track are kept in the order of adding, as keys of dict
+track_fields = \
+    [
+        'SPOTY_SOURCE',
+        'SPOTY_PLAYLIST_NAME',
+        'SPOTY_PLAYLIST_ID',
+        'SPOTY_PLAYLIST_INDEX',
+        'SPOTY_FILE_NAME',
+        'SPOTY_TRACK_ID',
+        'SPOTY_TRACK_ADDED',
+        'SPOTY_LENGTH',
+        'SPOTIFY_TRACK_ID',
+        'SPOTIFY_ALBUM_ID',
+        'DEEZER_TRACK_ID',
+        'DEEZER_ALBUM_ID',
+        'DEEZER_ARTIST_ID',
+        'ISRC',
+        'ARTIST',
+        'ALBUMARTIST',
+        'TITLE',
+        'ALBUM',
+        'GENRE',
+        'YEAR',
+        'WWWAUDIOFILE',
+        'EXPLICIT',
+        'TRACK',
+        'GAIN',
+    ]
+
+track_fields_set = frozenset(track_fields)
+
+# records are opt-in: they save memory, but tags are read and compared slower than in dicts
+use_track_records = bool(settings.SPOTY.get('TRACK_RECORDS', False))
+
+
+class TrackKeys:
+    """Keys of the track in the order of adding. Tracks with the same keys in the same order share one object."""
+    keys: tuple
+    next_keys: dict
+
+    def __init__(self, keys: tuple):
+        self.keys = keys
+        self.next_keys = {}
+
+    def add(self, key: str):
+        next_keys = self.next_keys.get(key)
+        if next_keys is None:
+            # tracks are read in several threads, all of them get the same object
+            next_keys = self.next_keys.setdefault(key, TrackKeys(self.keys + (key,)))
+        return next_keys
+
+    def remove(self, key: str):
+        track_keys = no_keys
+        for k in self.keys:
+            if k != key:
+                track_keys = track_keys.add(k)
+        return track_keys
+
+
+no_keys = TrackKeys(())
+
+
+class Track(MutableMapping):
+    """Tags of one track. Can be used as dict. Common tags are stored in slots, other tags in overflow dict."""
+    __slots__ = track_fields + ['overflow', 'track_keys']
+
+    def __init__(self, tags: dict = None):
+        self.overflow = None  # created for the first tag which is not in slots
+        self.track_keys = no_keys
+        if tags is not None:
+            for key, value in tags.items():
+                self[key] = value
+
+    def __reduce__(self):
+        # shared keys are not pickled with the track
+        return Track, (dict(self.items()),)
+
+    def __getitem__(self, key):
+        try:
+            if key in track_fields_set:
+                return getattr(self, key)
+            return self.overflow[key]
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key in track_fields_set:
+            if not hasattr(self, key):
+                self.track_keys = self.track_keys.add(key)
+            setattr(self, key, value)
+            return
+        if self.overflow is None:
+            self.overflow = {}
+        if key not in self.overflow:
+            self.track_keys = self.track_keys.add(key)
+        self.overflow[key] = value
+
+    def __delitem__(self, key):
+        if key in track_fields_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        else:
+            if self.overflow is None:
+                raise KeyError(key)
+            del self.overflow[key]
+        self.track_keys = self.track_keys.remove(key)
+
+    def __contains__(self, key):
+        if key in track_fields_set:
+            return hasattr(self, key)
+        return self.overflow is not None and key in self.overflow
+
+    def __iter__(self):
+        return iter(self.track_keys.keys)
+
+    def __len__(self):
+        return len(self.track_keys.keys)
+
+    def __repr__(self):
+        return f'Track({dict(self.items())!r})'
+
+    def get(self, key, default=None):
+        if key in track_fields_set:
+            return getattr(self, key, default)
+        if self.overflow is None:
+            return default
+        return self.overflow.get(key, default)
+
+    # lists are returned, so tags can be changed while iterating them
+
+    def keys(self):
+        return list(self.track_keys.keys)
+
+    def values(self):
+        return [self[key] for key in self.track_keys.keys]
+
+    def items(self):
+        return [(key, self[key]) for key in self.track_keys.keys]
+
+    def copy(self):
+        return Track(self)
+
+
+def new_tags():
+    # Track records take less memory, but tags are taken from them slower than from dicts
+    if use_track_records:
+        return Track()
+    return {}
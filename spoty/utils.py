@@ -2,17 +2,30 @@ import os.path
 from datetime import datetime
 import click
 from spoty import settings
-from typing import List
+from spoty import log
+from spoty.tags_index import TagsIndex, NormalizedTagsCache, normalized_compare_tags, is_exact_compare_tags, \
+    get_exact_key, normalize_tag_value, COMPARE_LENGTH_TOLERANCE_SEC
+from spoty.minhash_index import MinHashIndex, similarity_tags
+from typing import List, Iterator
 import dateutil.parser
-import numpy as np
-from multiprocessing import Process, Lock, Queue, Value, Array
+import multiprocessing
+import threading
+from multiprocessing import Pool, Lock, Array
 import sys
 import time
 from time import strftime
 from time import gmtime
 import string
+import bisect
+import heapq
+import functools
+import calendar
 
-THREADS_COUNT = 12
+TRACK_ADDED_FORMAT = '%Y-%m-%d %H:%M:%S'  # format of SPOTY_TRACK_ADDED
+PATTERNS_CACHE_SIZE = 256  # compiled patterns of parse_pattern
+WORKER_TASK_SIZE = 500  # tracks in one task of worker process
+CALIBRATION_TRACKS_COUNT = 100  # tracks to measure the time of search before choosing parallel or serial run
+PARALLEL_MIN_SECONDS = 1.0  # starting of worker processes takes about this time, shorter searches run serially
 
 tag_allies = [
     ['YEAR', 'DATE'],
@@ -20,6 +33,29 @@ tag_allies = [
     ['DISK', 'DISKNUMBER']
 ]
 
+
+def make_tag_allies_map(allies_list: list):
+    # groups with common tags are merged.
+    # every tag gets the tuple of its allies, the tag itself is the last one
+    groups = []
+    for allies in allies_list:
+        group = list(dict.fromkeys(allies))
+        for other in [g for g in groups if any(tag in g for tag in group)]:
+            groups.remove(other)
+            group = other + [tag for tag in group if tag not in other]
+        groups.append(group)
+
+    allies_map = {}
+    for group in groups:
+        for tag in group:
+            allies_map[tag] = tuple([ally for ally in group if ally != tag] + [tag])
+    return allies_map
+
+
+# allies from the config file extend the default ones
+tag_allies_map = make_tag_allies_map(
+    tag_allies + [allies.upper().split(',') for allies in settings.SPOTY.get('TAG_ALLIES', [])])
+
 spoty_tags = \
     [
         'SPOTY_DUP_GROUP',
@@ -51,6 +87,13 @@ deezer_tags = [
     'DEEZER_LYRICS_ID',
 ]
 
+# tags which readers always keep, when only some tags are required by the next commands
+always_read_tags = spoty_tags + spotify_tags + deezer_tags + \
+                   [
+                       'SOURCE',
+                       'SOURCEID',
+                   ]
+
 main_tags = \
     [
         'ISRC',
@@ -104,6 +147,18 @@ additional_tags = \
     ]
 
 
+# tags that depend on tracks order or on previous search of duplicates
+order_independent_ignore_tags = \
+    [
+        'SPOTY_PLAYLIST_INDEX',
+        'SPOTY_DUP_GROUP',
+        'SPOTY_DEF_DUP_TAGS',
+        'SPOTY_PROB_DUP_TAGS',
+        'SPOTY_DUP_LIST',
+        'SPOTY_DUP_ID',
+    ]
+
+
 class DuplicatesGroup:
     source_tags: dict
     def_duplicates: list
@@ -129,20 +184,41 @@ class SpotyContext:
     tags_lists: list
     summary: list
     duplicates_groups: List[DuplicatesGroup]
+    duplicates_groups_stream: Iterator[DuplicatesGroup]
     unique_first_tracks: list
     unique_second_tracks: list
+    required_tags: set
+    tags_stream: Iterator[list]
 
     def __init__(self):
         self.tags_lists = []
         self.summary = []
         self.duplicates_groups = []
+        self.duplicates_groups_stream = None
         self.unique_first_tracks = []
         self.unique_second_tracks = []
+        self.required_tags = None  # None if all tags are required
+        self.tags_stream = None  # parts of the last tags list, when tracks are streamed (see get --stream)
 
 
 mutex = Lock()
 
 
+def collect_tags_stream(context: SpotyContext):
+    # streamed tracks are collected to the last tags list, for commands which need all tracks at once
+    if context.tags_stream is not None:
+        context.tags_lists[-1] = [tags for tags_list in context.tags_stream for tags in tags_list]
+        context.tags_stream = None
+
+
+def collect_tags_stream_if_needed(context: SpotyContext):
+    # commands which read the stream have reads_tags_stream attribute
+    ctx = click.get_current_context()
+    command = ctx.command.get_command(ctx, ctx.invoked_subcommand) if ctx.invoked_subcommand else None
+    if not getattr(command, 'reads_tags_stream', False):
+        collect_tags_stream(context)
+
+
 def tuple_to_list(some_tuple: tuple):
     l = []
     l.extend(some_tuple)
@@ -201,9 +277,61 @@ def remove_exist(exist_arr: list, new_arr: list):
     return new, exist
 
 
+class TagsSet:
+    """Tracks set which allows to find whether it has a track matching by compare tags."""
+    tags_to_compare: list
+    allow_missing: bool
+    cache: NormalizedTagsCache
+    tags_list: list
+    keys: set
+    index: TagsIndex
+
+    def __init__(self, tags_to_compare: list, allow_missing=False, cache: NormalizedTagsCache = None):
+        self.tags_to_compare = tags_to_compare
+        self.allow_missing = allow_missing
+        self.cache = cache if cache is not None else NormalizedTagsCache()
+        self.tags_list = []
+        self.keys = None
+        self.index = None
+
+        # missing tags match any value, so such tracks can't be found by key
+        if not allow_missing:
+            if is_exact_compare_tags(tags_to_compare):
+                self.keys = set()
+            else:
+                self.index = TagsIndex(tags_to_compare, self.cache)
+
+    def add(self, tags: dict):
+        if self.keys is not None:
+            key = get_exact_key(tags, self.tags_to_compare, self.cache)
+            if key is not None:
+                self.keys.add(key)
+            return
+
+        if self.index is not None:
+            self.index.add(tags, len(self.tags_list))
+        self.tags_list.append(tags)
+
+    def has_match(self, tags: dict):
+        if self.keys is not None:
+            key = get_exact_key(tags, self.tags_to_compare, self.cache)
+            return key is not None and key in self.keys
+
+        if self.index is not None:
+            candidates = [self.tags_list[i] for i in self.index.find(tags)]
+        else:
+            candidates = self.tags_list
+
+        for exist_tags in candidates:
+            if compare_tags(exist_tags, tags, self.tags_to_compare, self.allow_missing, self.cache):
+                return True
+        return False
+
+
 def remove_duplicated_tags(tags_list: list, tags_to_compare: list, allow_missing=False, show_progressbar=False):
     good = []
     duplicates = []
+    good_set = TagsSet(tags_to_compare, allow_missing)
     if show_progressbar:
         bar = click.progressbar(length=len(tags_list), label=f'Finding duplicates in {len(tags_list)} tracks')
 
@@ -211,14 +339,11 @@ def remove_duplicated_tags(tags_list: list, tags_to_compare: list, allow_missing
         if show_progressbar:
             bar.update(1)
 
-        found = False
-        for exist_tags in good:
-            if compare_tags(exist_tags, new_tags, tags_to_compare, allow_missing):
-                duplicates.append(new_tags)
-                found = True
-                break
-        if not found:
+        if good_set.has_match(new_tags):
+            duplicates.append(new_tags)
+        else:
             good.append(new_tags)
+            good_set.add(new_tags)
 
     if show_progressbar:
         bar.finish()
@@ -231,6 +356,9 @@ def remove_exist_tags(exist_tags_list: list, new_tags_list: list, tags_to_compar
                       show_progressbar=False):
     new = []
     exist = []
+    exist_set = TagsSet(tags_to_compare, allow_missing)
+    for exist_tags in exist_tags_list:
+        exist_set.add(exist_tags)
     if show_progressbar:
         bar = click.progressbar(new_tags_list,
                                 label=f'Searching for tags matching in {len(exist_tags_list)} and {len(new_tags_list)} tracks')
@@ -239,13 +367,9 @@ def remove_exist_tags(exist_tags_list: list, new_tags_list: list, tags_to_compar
         if show_progressbar:
             bar.update(1)
 
-        found = False
-        for exist_tags in exist_tags_list:
-            if compare_tags(exist_tags, new_tags, tags_to_compare, allow_missing):
-                exist.append(new_tags)
-                found = True
-                break
-        if not found:
+        if exist_set.has_match(new_tags):
+            exist.append(new_tags)
+        else:
             new.append(new_tags)
 
     if show_progressbar:
@@ -274,17 +398,23 @@ def remove_exist_tags_by_isrc_and_length_dict(exist_tags_dict: dict, new_tags_li
     new = []
     exist = []
 
-    COMPARE_LENGTH_TOLERANCE_SEC = int(settings.SPOTY.COMPARE_LENGTH_TOLERANCE_SEC)
+    # sorted lengths for each isrc, built on first request
+    exist_lengths = {}
 
     for new_tags in new_tags_list:
         found = False
 
         if 'ISRC' in new_tags and 'SPOTY_LENGTH' in new_tags:
-            if new_tags['ISRC'] in exist_tags_dict:
-                for exist_length in exist_tags_dict[new_tags['ISRC']]:
-                    if abs(int(new_tags['SPOTY_LENGTH']) - int(exist_length) < COMPARE_LENGTH_TOLERANCE_SEC):
-                        found = True
-                        break
+            isrc = new_tags['ISRC']
+            if isrc in exist_tags_dict:
+                if isrc not in exist_lengths:
+                    exist_lengths[isrc] = sorted(int(length) for length in exist_tags_dict[isrc])
+                lengths = exist_lengths[isrc]
+                length = int(new_tags['SPOTY_LENGTH'])
+                # the same tolerance as in compare_tags: the difference can be equal to it
+                i = bisect.bisect_left(lengths, length - COMPARE_LENGTH_TOLERANCE_SEC)
+                if i < len(lengths) and lengths[i] <= length + COMPARE_LENGTH_TOLERANCE_SEC:
+                    found = True
         if found:
             exist.append(new_tags)
         else:
@@ -339,7 +469,9 @@ def remove_exist_tags_by_isrc_artist_title_dict(exist_tags_by_isrc: dict, exist_
     return new, exist
 
 
-def compare_tags(tags1: dict, tags2: dict, tags_to_compare: list, allow_missing=False):
+def compare_tags(tags1: dict, tags2: dict, tags_to_compare: list, allow_missing=False,
+                 cache: NormalizedTagsCache = None):
+    # values are normalized by the cache if the tracks are compared many times
     for tag in tags_to_compare:
 
         if not tag in tags1 or not tag in tags2:
@@ -348,54 +480,34 @@ def compare_tags(tags1: dict, tags2: dict, tags_to_compare: list, allow_missing=
             else:
                 return False
 
-        if tag == 'SPOTY_LENGTH':
-            if abs(int(tags1['SPOTY_LENGTH']) - int(tags2['SPOTY_LENGTH'])) \
-                    > settings.SPOTY.COMPARE_LENGTH_TOLERANCE_SEC:
+        if tag not in normalized_compare_tags:
+            if tags1[tag] != tags2[tag]:
                 return False
-            else:
-                continue
+            continue
 
-        if tag == "ARTIST":
-            artist1 = tags1[tag].replace(',', ';').upper()
-            artist1 = artist1.split(';')
-            artist2 = tags2[tag].replace(',', ';').upper()
-            artist2 = artist2.split(';')
-            found = False
-            for art in artist1:
-                if art in artist2:
-                    found = True
-            if not found:
-                return False
-            else:
-                continue
+        if cache is not None:
+            value1 = cache.get_value(tags1, tag)
+            value2 = cache.get_value(tags2, tag)
+        else:
+            value1 = normalize_tag_value(tag, tags1[tag])
+            value2 = normalize_tag_value(tag, tags2[tag])
 
-        if tag == "TITLE":
-            title1 = tags1[tag].upper()
-            title1 = ''.join(char for char in title1 if char.isalnum())
-            title2 = tags2[tag].upper()
-            title2 = ''.join(char for char in title2 if char.isalnum())
-            if not title2.startswith(title1) and not title1.startswith(title2):
+        if tag == 'SPOTY_LENGTH':
+            if abs(value1 - value2) > COMPARE_LENGTH_TOLERANCE_SEC:
                 return False
-            else:
-                continue
+            continue
 
-        if tag == "ALBUM":
-            album1 = tags1[tag].upper()
-            album2 = tags2[tag].upper()
-            if not album2.startswith(album1) and not album1.startswith(album2):
+        if tag == "ARTIST":
+            if value1.isdisjoint(value2):
                 return False
-            else:
-                continue
+            continue
 
-        if tag == "ISRC":
-            isrc1 = tags1[tag].upper().replace('-', '')
-            isrc2 = tags2[tag].upper().replace('-', '')
-            if isrc1 != isrc2:
+        if tag == "TITLE" or tag == "ALBUM":
+            if not value2.startswith(value1) and not value1.startswith(value2):
                 return False
-            else:
-                continue
+            continue
 
-        if tags1[tag] != tags2[tag]:
+        if value1 != value2:
             return False
 
     return True
@@ -460,6 +572,41 @@ def print_tags_list_grouped(tags_list: list, print_pattern: str, grouping_patter
         print_tags_list(tags_l, print_pattern)
 
 
+def print_tags_stream_grouped(tags_stream: Iterator[list], print_pattern: str, grouping_pattern: str):
+    # tracks are printed as soon as they are received. the group is printed again if its tracks are not in a row.
+    # returns the count of tracks and groups
+    print_segments = compile_pattern(print_pattern)
+    grouping_segments = compile_pattern(grouping_pattern)
+    tracks_count = 0
+    groups = set()
+    last_group = None
+
+    for tags_list in tags_stream:
+        for tags in tags_list:
+            group = render_pattern(tags, grouping_segments)
+            if group != last_group or tracks_count == 0:
+                print(f'\n------------------------- {group}:')
+                groups.add(group)
+                last_group = group
+            print("  " + render_pattern(tags, print_segments))
+            tracks_count += 1
+
+    return tracks_count, len(groups)
+
+
+def count_tags_stream_grouped(tags_stream: Iterator[list], grouping_pattern: str):
+    # returns the count of tracks and groups
+    grouping_segments = compile_pattern(grouping_pattern)
+    tracks_count = 0
+    groups = set()
+
+    for tags_list in tags_stream:
+        tracks_count += len(tags_list)
+        groups.update(render_pattern(tags, grouping_segments) for tags in tags_list)
+
+    return tracks_count, len(groups)
+
+
 def print_tags_list(tags_list: list, print_pattern: str):
     if len(tags_list) == 0:
         return
@@ -481,26 +628,41 @@ def print_duplicates_tags_list(tags_list: list, print_pattern: str = None):
 
 
 def check_tag_has_allies(tag: str):
-    for allies in tag_allies:
-        if tag in allies:
-            return True
-    return False
+    return tag in tag_allies_map
 
 
 def get_tag_allies(tag: str, include_source_tag=True):
-    res = []
-    for allies in tag_allies:
-        if tag in allies:
-            res = allies.copy()
+    allies = tag_allies_map.get(tag, (tag,))
+    if include_source_tag:
+        return list(allies)
+    return list(allies[:-1])
 
-    if tag in res:
-        res.remove(tag)
 
-    if include_source_tag:
-        res.append(tag)
+def get_tags_with_allies(tags: list):
+    res = []
+    for tag in tags:
+        res.extend(get_tag_allies(tag, True))
     return res
 
 
+def get_pattern_tags(pattern: str):
+    return [tag for segment in compile_pattern(pattern) if type(segment) is tuple for tag in segment]
+
+
+def get_compare_tags_list_tags(compare_tags_list: list):
+    tags = [tag for tags_to_compare in compare_tags_list for tag in tags_to_compare.split(',')]
+    return get_tags_with_allies(tags)
+
+
+def remove_not_required_tags(tags: dict, required_tags: set):
+    if required_tags is None:
+        return tags
+    for key in list(tags.keys()):
+        if key not in required_tags:
+            del tags[key]
+    return tags
+
+
 def print_tags(tags: dict, tags_to_print: list):
     for tag in tags_to_print:
         allies = get_tag_allies(tag, True)
@@ -519,6 +681,17 @@ def add_playlist_index_from_playlist_names(tags_list: list):
     return res
 
 
+def add_playlist_index_in_stream(tags_list: list, last_indexes: dict):
+    # tracks are not reordered by playlists. last_indexes (playlist name -> index) are kept for the next parts
+    segments = compile_pattern("%SPOTY_PLAYLIST_NAME%")
+    for tags in tags_list:
+        group = render_pattern(tags, segments)
+        index = last_indexes.get(group, 0) + 1
+        last_indexes[group] = index
+        tags['SPOTY_PLAYLIST_INDEX'] = str(index)
+    return tags_list
+
+
 def filter_tags_list_have_tags(tags_list: list, filter_tags: list):
     filtered = []
     for tags in tags_list:
@@ -535,18 +708,26 @@ def filter_tags_list_have_no_tags(tags_list: list, filter_tags: list):
     return filtered
 
 
+def parse_date_epoch(date: str):
+    # dates without time zone are taken as is, like SPOTY_TRACK_ADDED values
+    try:
+        specified_date = dateutil.parser.parse(date)
+    except:
+        click.echo(f'Cant parse date: "{date}". Use this format: "2018-06-29 08:15:27"', err=True)
+        exit()
+    return calendar.timegm(specified_date.utctimetuple())
+
+
+def get_track_added_epoch(tags: dict):
+    return calendar.timegm(datetime.strptime(tags['SPOTY_TRACK_ADDED'], TRACK_ADDED_FORMAT).timetuple())
+
+
 def filter_added_after_date(tags_list: list, date: str, add_if_date_tag_missing=False):
+    specified_date = parse_date_epoch(date)
     filtered = []
     for tags in tags_list:
         if 'SPOTY_TRACK_ADDED' in tags:
-            track_added = datetime.strptime(tags['SPOTY_TRACK_ADDED'], "%Y-%m-%d %H:%M:%S")
-            # specified_date = datetime.strptime(added_after_time, "%Y-%m-%d %H:%M:%S")
-            try:
-                specified_date = dateutil.parser.parse(date)
-            except:
-                click.echo(f'Cant parse date: "{date}". Use this format: "2018-06-29 08:15:27"', err=True)
-                exit()
-            if track_added > specified_date:
+            if get_track_added_epoch(tags) > specified_date:
                 filtered.append(tags)
         else:
             if add_if_date_tag_missing:
@@ -555,17 +736,11 @@ def filter_added_after_date(tags_list: list, date: str, add_if_date_tag_missing=
 
 
 def filter_added_before_date(tags_list: list, date: str, add_if_date_tag_missing=False):
+    specified_date = parse_date_epoch(date)
     filtered = []
     for tags in tags_list:
         if 'SPOTY_TRACK_ADDED' in tags:
-            track_added = datetime.strptime(tags['SPOTY_TRACK_ADDED'], "%Y-%m-%d %H:%M:%S")
-            # specified_date = datetime.strptime(added_after_time, "%Y-%m-%d %H:%M:%S")
-            try:
-                specified_date = dateutil.parser.parse(date)
-            except:
-                click.echo(f'Cant parse date: "{date}". Use this format: "2018-06-29 08:15:27"', err=True)
-                exit()
-            if track_added < specified_date:
+            if get_track_added_epoch(tags) < specified_date:
                 filtered.append(tags)
         else:
             if add_if_date_tag_missing:
@@ -593,9 +768,10 @@ def check_all_tags_exist(tags: dict, tags_to_check: list):
 
 def group_tags_by_pattern(tags_list: list, pattern: str, not_found_tag_name="Unknown"):
     groups = {}
+    segments = compile_pattern(pattern)
 
     for tags in tags_list:
-        group_name = parse_pattern(tags, pattern)
+        group_name = render_pattern(tags, segments)
 
         if not group_name in groups:
             groups[group_name] = []
@@ -606,27 +782,36 @@ def group_tags_by_pattern(tags_list: list, pattern: str, not_found_tag_name="Unk
 
 
 def parse_pattern(tags: dict, pattern: str):
-    result = ""
-    tag_name = ""
-    building_tag = False
-    for c in pattern:
-        if c == "%":
-            building_tag = not building_tag
-            if not building_tag:
-                allies = get_tag_allies(tag_name, True)
-                for a in allies:
-                    if a in tags:
-                        tag = tags[a]
-                        result += str(tag)
-                tag_name = ""
+    return render_pattern(tags, compile_pattern(pattern))
+
+
+@functools.lru_cache(maxsize=PATTERNS_CACHE_SIZE)
+def compile_pattern(pattern: str):
+    # pattern is compiled to tuple of texts and tuples of tag allies (for %TAG%).
+    # tags are between odd and even "%" characters, the tag without closing "%" is skipped
+    parts = pattern.split('%')
+    if len(parts) % 2 == 0:
+        parts.pop()
+
+    segments = []
+    for i, part in enumerate(parts):
+        if i % 2 == 1:
+            segments.append(tuple(get_tag_allies(part.upper(), True)))
+        elif len(part) > 0:
+            segments.append(part)
+    return tuple(segments)
+
+
+def render_pattern(tags: dict, segments: tuple):
+    result = []
+    for segment in segments:
+        if type(segment) is str:
+            result.append(segment)
         else:
-            if building_tag:
-                tag_name += c
-                tag_name = tag_name.upper()
-            else:
-                result += c
-
-    return result
+            for tag in segment:  # values of all allies are added
+                if tag in tags:
+                    result.append(str(tags[tag]))
+    return ''.join(result)
 
 
 def reorder_tag_keys_main_first(keys: list):
@@ -685,13 +870,7 @@ def get_missing_tags(exist_tags: dict, new_tags: dict, compare_tags: list = None
         if key in exist_tags:
             continue
 
-        found = False
-        for aliases in tag_allies:
-            if key in aliases:
-                for al in aliases:
-                    if al in exist_tags:
-                        found = True
-        if found:
+        if key in tag_allies_map and any(ally in exist_tags for ally in tag_allies_map[key]):
             continue
 
         missing_tags[key] = value
@@ -765,35 +944,145 @@ def clean_tags_after_read(tags):
 
 
 def find_duplicates_in_groups(check_tags: dict, groups: List[DuplicatesGroup], compare_tags_list: list,
-                              compare_with_def_duplicates=False, compare_with_prob_duplicates=False) -> (
+                              compare_with_def_duplicates=False, compare_with_prob_duplicates=False,
+                              cache: NormalizedTagsCache = None) -> (
         DuplicatesGroup, list):
     if len(compare_tags_list) == 0:
         return None, None
 
+    if cache is None:
+        cache = NormalizedTagsCache()
+
     for tags_to_compare in compare_tags_list:
         for group in groups:
             if len(group.source_tags.items()) > 0:
-                if compare_tags(check_tags, group.source_tags, tags_to_compare, False):
+                if compare_tags(check_tags, group.source_tags, tags_to_compare, False, cache):
                     return group, tags_to_compare
 
     if compare_with_def_duplicates:
         for tags_to_compare in compare_tags_list:
             for group in groups:
                 for tags in group.def_duplicates:
-                    if compare_tags(check_tags, tags, tags_to_compare, False):
+                    if compare_tags(check_tags, tags, tags_to_compare, False, cache):
                         return group, tags_to_compare
 
     if compare_with_prob_duplicates:
         for tags_to_compare in compare_tags_list:
             for group in groups:
                 for tags in group.prob_duplicates:
-                    if compare_tags(check_tags, tags, tags_to_compare, False):
+                    if compare_tags(check_tags, tags, tags_to_compare, False, cache):
                         return group, tags_to_compare
     return None, None
 
 
+class DuplicatesGroupsIndex:
+    """Duplicates groups with hash indexes of source tags, definitely and probably duplicates."""
+    groups: List[DuplicatesGroup]
+    groups_numbers: dict
+    cache: NormalizedTagsCache
+    source_indexes: dict
+    def_indexes: dict
+    prob_indexes: dict
+
+    def __init__(self, compare_tags_list: list):
+        self.cache = NormalizedTagsCache()
+        self.groups = []
+        self.groups_numbers = {}
+        self.source_indexes = {}
+        self.def_indexes = {}
+        self.prob_indexes = {}
+        for tags_to_compare in compare_tags_list:
+            key = tuple(tags_to_compare)
+            self.source_indexes[key] = TagsIndex(tags_to_compare, self.cache)
+            self.def_indexes[key] = TagsIndex(tags_to_compare, self.cache)
+            self.prob_indexes[key] = TagsIndex(tags_to_compare, self.cache)
+
+    def add_group(self, group: DuplicatesGroup):
+        group_number = len(self.groups)
+        self.groups.append(group)
+        self.groups_numbers[id(group)] = group_number
+        if len(group.source_tags.items()) > 0:
+            for index in self.source_indexes.values():
+                index.add(group.source_tags, (group_number, 0))
+
+    def add_def_duplicate(self, group: DuplicatesGroup, tags: dict, found_tags: list):
+        item = (self.groups_numbers[id(group)], len(group.def_duplicates))
+        group.def_duplicates.append(tags)
+        group.def_found_tags.append(found_tags)
+        for index in self.def_indexes.values():
+            index.add(tags, item)
+
+    def add_prob_duplicate(self, group: DuplicatesGroup, tags: dict, found_tags: list):
+        item = (self.groups_numbers[id(group)], len(group.prob_duplicates))
+        group.prob_duplicates.append(tags)
+        group.prob_found_tags.append(found_tags)
+        for index in self.prob_indexes.values():
+            index.add(tags, item)
+
+    def find_duplicates(self, check_tags: dict, compare_tags_list: list,
+                        compare_with_def_duplicates=False, compare_with_prob_duplicates=False) -> (
+            DuplicatesGroup, list):
+        group_number, found_tags = self.find_duplicates_group_number(check_tags, compare_tags_list,
+                                                                     compare_with_def_duplicates,
+                                                                     compare_with_prob_duplicates)
+        if group_number is None:
+            return None, None
+        return self.groups[group_number], found_tags
+
+    def find_duplicates_group_number(self, check_tags: dict, compare_tags_list: list,
+                                     compare_with_def_duplicates=False, compare_with_prob_duplicates=False) -> (
+            int, list):
+        # same search order as find_duplicates_in_groups, but only within index candidates
+
+        if len(compare_tags_list) == 0:
+            return None, None
+
+        group_number, found_tags = self.find_in_indexes(check_tags, compare_tags_list, self.source_indexes,
+                                                        lambda group, pos: group.source_tags)
+        if group_number is not None:
+            return group_number, found_tags
+
+        if compare_with_def_duplicates:
+            group_number, found_tags = self.find_in_indexes(check_tags, compare_tags_list, self.def_indexes,
+                                                            lambda group, pos: group.def_duplicates[pos])
+            if group_number is not None:
+                return group_number, found_tags
+
+        if compare_with_prob_duplicates:
+            group_number, found_tags = self.find_in_indexes(check_tags, compare_tags_list, self.prob_indexes,
+                                                            lambda group, pos: group.prob_duplicates[pos])
+            if group_number is not None:
+                return group_number, found_tags
+
+        return None, None
+
+    def find_in_indexes(self, check_tags: dict, compare_tags_list: list, indexes: dict, get_tags):
+        for tags_to_compare in compare_tags_list:
+            candidates = indexes[tuple(tags_to_compare)].find(check_tags)
+            for group_number, pos in sorted(candidates):
+                group = self.groups[group_number]
+                if compare_tags(check_tags, get_tags(group, pos), tags_to_compare, False, self.cache):
+                    return group_number, tags_to_compare
+        return None, None
+
+    def find_in_duplicates_sources(self, check_tags: dict, compare_tags_list: list) -> list:
+        # only sources of groups which have duplicates are compared, returns found compare tags
+        for tags_to_compare in compare_tags_list:
+            for group_number, pos in self.source_indexes[tuple(tags_to_compare)].find(check_tags):
+                group = self.groups[group_number]
+                if group.has_duplicates() and \
+                        compare_tags(check_tags, group.source_tags, tags_to_compare, False, self.cache):
+                    return tags_to_compare
+        return None
+
+    def __setstate__(self, state):
+        # ids of groups are changed after unpickling in worker process
+        self.__dict__.update(state)
+        self.groups_numbers = {id(group): i for i, group in enumerate(self.groups)}
+
+
 def find_duplicates_in_tag_list2(tags_list: list, compare_tags_def_list: list, compare_tags_prob_list: list,
-                                 add_dup_tags=False):
+                                 add_dup_tags=False, jobs: int = None, similarity: float = None):
     # get tags to compare from config
 
     for i, tags in enumerate(compare_tags_def_list):
@@ -802,25 +1091,17 @@ def find_duplicates_in_tag_list2(tags_list: list, compare_tags_def_list: list, c
     for i, tags in enumerate(compare_tags_prob_list):
         compare_tags_prob_list[i] = tags.split(',')
 
-    groups: List[DuplicatesGroup] = []
-
-    # find duplicates
-
-    with click.progressbar(tags_list, label=f'Finding duplicates in {len(tags_list)} tracks') as bar:
-        for tags in bar:
-            group, found_tags = find_duplicates_in_groups(tags, groups, compare_tags_def_list, True, True)
-            if group is not None:
-                group.def_duplicates.append(tags)
-                group.def_found_tags.append(found_tags)
-            else:
-                group, found_tags = find_duplicates_in_groups(tags, groups, compare_tags_prob_list, True, True)
-                if group is not None:
-                    group.prob_duplicates.append(tags)
-                    group.prob_found_tags.append(found_tags)
-                else:
-                    d = DuplicatesGroup()
-                    d.source_tags = tags
-                    groups.append(d)
+    # compare tracks in parallel, then add them to groups in the same order.
+    # the serial search stops at the first found group, so it doesn't keep matches of all pairs of tracks
+    matches = None
+    if get_workers_count(jobs) > 1:
+        matches = find_tags_matches(tags_list, compare_tags_def_list + compare_tags_prob_list, jobs=jobs,
+                                    only_parallel=True)
+    if matches is not None:
+        groups = make_duplicates_groups_from_matches(tags_list, matches, compare_tags_def_list,
+                                                     compare_tags_prob_list, similarity)
+    else:
+        groups = find_duplicates_groups(tags_list, compare_tags_def_list, compare_tags_prob_list, similarity)
 
     # remove unique
 
@@ -833,22 +1114,395 @@ def find_duplicates_in_tag_list2(tags_list: list, compare_tags_def_list: list, c
             unique_tracks.append(group.source_tags)
 
     if add_dup_tags:
-        for i, group in enumerate(duplicates_groups):
-            if len(group.source_tags.items()) > 0:
-                group.source_tags['SPOTY_DUP_GROUP'] = i + 1
-            for y, tags in enumerate(group.def_duplicates):
-                tags['SPOTY_DUP_GROUP'] = i + 1
-                tags['SPOTY_DEF_DUP_TAGS'] = ','.join(group.def_found_tags[y])
-            for y, tags in enumerate(group.prob_duplicates):
-                tags['SPOTY_DUP_GROUP'] = i + 1
-                tags['SPOTY_PROB_DUP_TAGS'] = ','.join(group.prob_found_tags[y])
+        add_duplicates_groups_tags(duplicates_groups)
+
+    return duplicates_groups, unique_tracks
+
+
+def find_duplicates_groups(tags_list: list, compare_tags_def_list: list, compare_tags_prob_list: list,
+                           similarity: float = None):
+    groups_index = DuplicatesGroupsIndex(compare_tags_def_list + compare_tags_prob_list)
+
+    # tracks with similar artist and title are probably duplicates too
+    similar_index = MinHashIndex(similarity) if similarity is not None else None
+    tracks_groups = []  # group number of each track
+
+    with click.progressbar(tags_list, label=f'Finding duplicates in {len(tags_list)} tracks') as bar:
+        for i, tags in enumerate(bar):
+            group, found_tags = groups_index.find_duplicates(tags, compare_tags_def_list, True, True)
+            if group is not None:
+                groups_index.add_def_duplicate(group, tags, found_tags)
+            else:
+                group, found_tags = groups_index.find_duplicates(tags, compare_tags_prob_list, True, True)
+                if group is None and similar_index is not None:
+                    group_number = find_similar_group(similar_index, tags, tracks_groups)
+                    if group_number is not None:
+                        group = groups_index.groups[group_number]
+                        found_tags = list(similarity_tags)
+                if group is not None:
+                    groups_index.add_prob_duplicate(group, tags, found_tags)
+                else:
+                    group = DuplicatesGroup()
+                    group.source_tags = tags
+                    groups_index.add_group(group)
+
+            if similar_index is not None:
+                tracks_groups.append(groups_index.groups_numbers[id(group)])
+                similar_index.add(tags, i)
+
+    return groups_index.groups
+
+
+def find_similar_group(similar_index: MinHashIndex, tags: dict, tracks_groups: list):
+    # the group of the most similar previous track
+    found = similar_index.find(tags)
+    if len(found) == 0:
+        return None
+    similarity, i = found[0]
+    return tracks_groups[i]
+
+
+SOURCE_ROLE = 0
+DEF_DUPLICATE_ROLE = 1
+PROB_DUPLICATE_ROLE = 2
+
+
+def make_duplicates_groups_from_matches(tags_list: list, matches: list, compare_tags_def_list: list,
+                                        compare_tags_prob_list: list, similarity: float = None):
+    # gives the same groups as find_duplicates_groups, using matches of each track with previous tracks
+
+    previous_matches = {}
+    for i, j, k in matches:
+        add_previous_match(previous_matches, i, j, k)
+
+    groups: List[DuplicatesGroup] = []
+    for i, group_number in add_tracks_to_groups(tags_list, previous_matches, compare_tags_def_list,
+                                                compare_tags_prob_list, groups, similarity):
+        pass
+    return groups
+
+
+def add_previous_match(previous_matches: dict, i: int, j: int, k: int):
+    # the match is kept by the later track of the pair
+    if j > i:
+        i, j = j, i
+    track_matches = previous_matches.get(i)
+    if track_matches is None:
+        track_matches = []
+        previous_matches[i] = track_matches
+    track_matches.append((j, k))
+
+
+def add_tracks_to_groups(tags_list: list, previous_matches: dict, compare_tags_def_list: list,
+                         compare_tags_prob_list: list, groups: list, similarity: float = None):
+    # adds tracks to groups in order, yields each track index and its group number.
+    # previous_matches has matches of each track with previous tracks (see add_previous_match).
+    # they are taken when the track is added, so they can be added while tracks are yielded
+
+    compare_tags_list = compare_tags_def_list + compare_tags_prob_list
+    def_indexes = range(len(compare_tags_def_list))
+    prob_indexes = range(len(compare_tags_def_list), len(compare_tags_list))
+
+    roles = [None] * len(tags_list)  # (role, group number, position in group) for each track
+
+    similar_index = MinHashIndex(similarity) if similarity is not None else None
+    tracks_groups = []  # group number of each track
+
+    for i, tags in enumerate(tags_list):
+        track_matches = previous_matches.pop(i, [])
+        group_number, k = find_duplicates_in_previous_matches(track_matches, roles, def_indexes)
+        if group_number is not None:
+            group = groups[group_number]
+            roles[i] = (DEF_DUPLICATE_ROLE, group_number, len(group.def_duplicates))
+            group.def_duplicates.append(tags)
+            group.def_found_tags.append(compare_tags_list[k])
+        else:
+            group_number, k = find_duplicates_in_previous_matches(track_matches, roles, prob_indexes)
+            found_tags = compare_tags_list[k] if group_number is not None else None
+
+            if group_number is None and similar_index is not None:
+                group_number = find_similar_group(similar_index, tags, tracks_groups)
+                found_tags = list(similarity_tags)
+
+            if group_number is not None:
+                group = groups[group_number]
+                roles[i] = (PROB_DUPLICATE_ROLE, group_number, len(group.prob_duplicates))
+                group.prob_duplicates.append(tags)
+                group.prob_found_tags.append(found_tags)
+            else:
+                group_number = len(groups)
+                roles[i] = (SOURCE_ROLE, group_number, 0)
+                d = DuplicatesGroup()
+                d.source_tags = tags
+                groups.append(d)
+
+        if similar_index is not None:
+            tracks_groups.append(group_number)
+            similar_index.add(tags, i)
+
+        yield i, group_number
+
+
+def iterate_duplicates_in_tag_list(tags_list: list, compare_tags_def_list: list, compare_tags_prob_list: list,
+                                   add_dup_tags=False, jobs: int = None):
+    # yields the same duplicates groups as find_duplicates_in_tag_list2, in the same order and with the same numbers.
+    # tracks are compared with next tracks in order, so matches of the track with previous tracks are known
+    # when the search passes it. the group is final when the search passes the last match of its tracks,
+    # it is yielded when all previous groups are yielded.
+
+    compare_tags_def_list = [tags.split(',') for tags in compare_tags_def_list]
+    compare_tags_prob_list = [tags.split(',') for tags in compare_tags_prob_list]
+    compare_tags_list = compare_tags_def_list + compare_tags_prob_list
+
+    indexes, cache = make_tags_indexes(tags_list, compare_tags_list)
+    data = (tags_list, compare_tags_list, indexes, cache)
+
+    previous_matches = {}
+    last_matches = {}  # the last next track matched with the track
+    groups: List[DuplicatesGroup] = []
+    tracks = add_tracks_to_groups(tags_list, previous_matches, compare_tags_def_list, compare_tags_prob_list, groups)
+
+    groups_ends = []  # the last track which can be added to the group
+    ends_heap = []
+    closed = []
+    next_group = 0  # the first group which is not yielded
+    yielded_count = 0
+
+    for positions, task_matches in iterate_tasks(find_next_tags_matches_task, data, len(tags_list), jobs):
+        for i, j, k in task_matches:
+            add_previous_match(previous_matches, i, j, k)
+            last_matches[i] = max(last_matches.get(i, j), j)
+
+        # matches of the tracks of the task with previous tracks are known now
+        for p in positions:
+            i, group_number = next(tracks)
+            last_match = last_matches.pop(i, i)
+            if group_number == len(groups_ends):
+                groups_ends.append(-1)  # new group
+                closed.append(False)
+            if last_match > groups_ends[group_number]:
+                groups_ends[group_number] = last_match
+                heapq.heappush(ends_heap, (last_match, group_number))
+
+            while len(ends_heap) > 0 and ends_heap[0][0] <= i:
+                end, group_number = heapq.heappop(ends_heap)
+                if end == groups_ends[group_number]:
+                    closed[group_number] = True
+
+            while next_group < len(groups) and closed[next_group]:
+                group = groups[next_group]
+                groups[next_group] = None  # release the group
+                next_group += 1
+                if group.has_duplicates():
+                    yielded_count += 1
+                    if add_dup_tags:
+                        add_duplicates_group_tags(group, yielded_count)
+                    yield group
+
+
+def find_duplicates_in_previous_matches(track_matches: list, roles: list, compare_tags_indexes: range):
+    # the same search order as find_duplicates_in_groups: sources, definitely and probably duplicates,
+    # compare tags in order, groups in order
+    for role in (SOURCE_ROLE, DEF_DUPLICATE_ROLE, PROB_DUPLICATE_ROLE):
+        for k in compare_tags_indexes:
+            found = None
+            for j, match_k in track_matches:
+                if match_k == k and roles[j][0] == role:
+                    if found is None or roles[j][1:] < found:
+                        found = roles[j][1:]
+            if found is not None:
+                return found[0], k
+    return None, None
+
+
+def add_duplicates_groups_tags(duplicates_groups: List[DuplicatesGroup]):
+    for i, group in enumerate(duplicates_groups):
+        add_duplicates_group_tags(group, i + 1)
+
+
+def add_duplicates_group_tags(group: DuplicatesGroup, group_number: int):
+    if len(group.source_tags.items()) > 0:
+        group.source_tags['SPOTY_DUP_GROUP'] = group_number
+    for y, tags in enumerate(group.def_duplicates):
+        tags['SPOTY_DUP_GROUP'] = group_number
+        tags['SPOTY_DEF_DUP_TAGS'] = ','.join(group.def_found_tags[y])
+    for y, tags in enumerate(group.prob_duplicates):
+        tags['SPOTY_DUP_GROUP'] = group_number
+        tags['SPOTY_PROB_DUP_TAGS'] = ','.join(group.prob_found_tags[y])
+
+
+def get_track_order_key(tags: dict):
+    # the key does not depend on order of tracks in the list, so it can be used to sort tracks stably
+    items = []
+    for key, value in tags.items():
+        if key not in order_independent_ignore_tags:
+            items.append((key, str(value)))
+    items.sort()
+    return get_track_identity(tags), tuple(items)
+
+
+def get_track_identity(tags: dict):
+    source = tags.get('SPOTY_SOURCE', '')
+    if 'SPOTY_FILE_NAME' in tags:
+        return f'{source}:{tags["SPOTY_FILE_NAME"]}'
+    if 'SPOTY_TRACK_ID' in tags:
+        return f'{source}:{tags.get("SPOTY_PLAYLIST_ID", "")}:{tags["SPOTY_TRACK_ID"]}'
+    return f'{source}:{tags.get("SPOTY_PLAYLIST_ID", "")}:{tags.get("ARTIST", "")} - {tags.get("TITLE", "")}'
+
+
+def find_duplicates_in_tag_list_clusters(tags_list: list, compare_tags_def_list: list, compare_tags_prob_list: list,
+                                         add_dup_tags=False, jobs: int = None):
+    # groups all tracks connected by any match (union-find), so the result does not depend on tracks order
+
+    compare_tags_def_list = [tags.split(',') for tags in compare_tags_def_list]
+    compare_tags_prob_list = [tags.split(',') for tags in compare_tags_prob_list]
+
+    matches = find_tags_matches(tags_list, compare_tags_def_list + compare_tags_prob_list, jobs=jobs)
+    duplicates_groups, unique_tracks = make_duplicates_clusters(tags_list, matches, compare_tags_def_list,
+                                                                compare_tags_prob_list)
+
+    if add_dup_tags:
+        add_duplicates_groups_tags(duplicates_groups)
+
+    return duplicates_groups, unique_tracks
+
+
+def find_tags_matches(tags_list: list, compare_tags_list: list, check_indexes: list = None, jobs: int = None,
+                      only_parallel=False):
+    # returns (track index, matched track index, compare tags index) for each match.
+    # if check_indexes specified, only these tracks are compared with all others,
+    # otherwise each track is compared with previous tracks, so each pair is checked once.
+    # two checked tracks are also compared once, by the first of them.
+    # if only_parallel, returns None when the search is not long enough for worker processes
+
+    indexes, cache = make_tags_indexes(tags_list, compare_tags_list)
+    checked = set(check_indexes) if check_indexes is not None else None
+    data = (tags_list, compare_tags_list, indexes, cache, check_indexes, checked)
+
+    if check_indexes is not None:
+        label = f'Finding duplicates for {len(check_indexes)} tracks'
+        count = len(check_indexes)
+    else:
+        label = f'Finding duplicates in {len(tags_list)} tracks'
+        count = len(tags_list)
+
+    min_parallel_count = None
+    if only_parallel:
+        if get_workers_count(jobs) <= 1 or not is_parallel_faster(find_tags_matches_task, data, count):
+            return None
+        min_parallel_count = 0  # already measured
+
+    matches = []
+    with click.progressbar(length=count, label=label) as bar:
+        for task_matches in run_tasks(find_tags_matches_task, data, count, jobs, bar, min_parallel_count):
+            matches.extend(task_matches)
+
+    return matches
+
+
+def find_tags_matches_task(data, positions: range):
+    tags_list, compare_tags_list, indexes, cache, check_indexes, checked = data
+    matches = []
+
+    for p in positions:
+        i = check_indexes[p] if check_indexes is not None else p
+        tags = tags_list[i]
+        for k, tags_to_compare in enumerate(compare_tags_list):
+            for j in indexes[k].find(tags):
+                if check_indexes is not None:
+                    if j == i or j > i and j in checked:
+                        continue
+                elif j >= i:
+                    continue
+                if compare_tags(tags, tags_list[j], tags_to_compare, False, cache):
+                    matches.append((i, j, k))
+
+    return matches
+
+
+def make_tags_indexes(tags_list: list, compare_tags_list: list):
+    cache = NormalizedTagsCache()
+    indexes = [TagsIndex(tags_to_compare, cache) for tags_to_compare in compare_tags_list]
+    for index in indexes:
+        for i, tags in enumerate(tags_list):
+            index.add(tags, i)
+    return indexes, cache
+
+
+def find_next_tags_matches_task(data, positions: range):
+    # matches of each track with next tracks
+    tags_list, compare_tags_list, indexes, cache = data
+    matches = []
+
+    for i in positions:
+        tags = tags_list[i]
+        for k, tags_to_compare in enumerate(compare_tags_list):
+            for j in indexes[k].find(tags):
+                if j > i and compare_tags(tags, tags_list[j], tags_to_compare, False, cache):
+                    matches.append((i, j, k))
+
+    return matches
+
+
+def make_duplicates_clusters(tags_list: list, matches: list, compare_tags_def_list: list,
+                             compare_tags_prob_list: list):
+    compare_tags_list = compare_tags_def_list + compare_tags_prob_list
+
+    parents = list(range(len(tags_list)))
+    found_tags_indexes = [None] * len(tags_list)  # the first matched compare tags for each track
+
+    def find_root(i):
+        root = i
+        while parents[root] != root:
+            root = parents[root]
+        while parents[i] != root:
+            parents[i], i = root, parents[i]
+        return root
+
+    for i, j, k in matches:
+        for t in (i, j):
+            if found_tags_indexes[t] is None or k < found_tags_indexes[t]:
+                found_tags_indexes[t] = k
+        root_i = find_root(i)
+        root_j = find_root(j)
+        if root_i != root_j:
+            parents[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters = {}
+    for i in range(len(tags_list)):
+        root = find_root(i)
+        if root not in clusters:
+            clusters[root] = []
+        clusters[root].append(i)
+
+    unique_tracks = []
+    duplicates_groups: List[DuplicatesGroup] = []
+    for root, cluster in clusters.items():
+        if len(cluster) == 1:
+            unique_tracks.append(tags_list[cluster[0]])
+            continue
+
+        cluster.sort(key=lambda i: get_track_order_key(tags_list[i]))
+        group = DuplicatesGroup()
+        group.source_tags = tags_list[cluster[0]]
+        for i in cluster[1:]:
+            k = found_tags_indexes[i]
+            if k < len(compare_tags_def_list):
+                group.def_duplicates.append(tags_list[i])
+                group.def_found_tags.append(compare_tags_list[k])
+            else:
+                group.prob_duplicates.append(tags_list[i])
+                group.prob_found_tags.append(compare_tags_list[k])
+        duplicates_groups.append(group)
+
+    duplicates_groups.sort(key=lambda group: get_track_order_key(group.source_tags))
 
     return duplicates_groups, unique_tracks
 
 
 def find_duplicates_in_tag_lists(source_list: list, dest_list: list, compare_tags_def_list: list,
                                  compare_tags_prob_list: list,
-                                 add_dup_tags=False, remove_duplicates_in_source=True):
+                                 add_dup_tags=False, remove_duplicates_in_source=True, jobs: int = None):
     # get tags to compare from config
 
     for i, tags in enumerate(compare_tags_def_list):
@@ -859,80 +1513,45 @@ def find_duplicates_in_tag_lists(source_list: list, dest_list: list, compare_tag
 
     # find duplicates in dest
 
-    groups: List[DuplicatesGroup] = []
+    groups_index = DuplicatesGroupsIndex(compare_tags_def_list + compare_tags_prob_list)
     unique_dest_tracks = []
 
     for source_tags in source_list:
         d = DuplicatesGroup()
         d.source_tags = source_tags
-        groups.append(d)
+        groups_index.add_group(d)
+
+    groups = groups_index.groups
 
-    if len(source_list) + len(dest_list) < 2000:  # single thread
-        with click.progressbar(dest_list,
+    data = (groups_index, dest_list, compare_tags_def_list, compare_tags_prob_list)
+    matches = []
+    try:
+        with click.progressbar(length=len(dest_list),
                                label=f'Finding duplicates in {len(source_list) + len(dest_list)} tracks') as bar:
-            for dest_tags in bar:
-                group, found_tags = find_duplicates_in_groups(dest_tags, groups, compare_tags_def_list)
-                if group is not None:
-                    group.def_duplicates.append(dest_tags)
-                    group.def_found_tags.append(found_tags)
-                else:
-                    group, found_tags = find_duplicates_in_groups(dest_tags, groups, compare_tags_prob_list)
-                    if group is not None:
-                        group.prob_duplicates.append(dest_tags)
-                        group.prob_found_tags.append(found_tags)
-                    else:
-                        unique_dest_tracks.append(dest_tags)
-    else:  # multi thread
-        try:
-            parts = np.array_split(dest_list, THREADS_COUNT)
-            threads = []
-            counters = []
-            results = Queue()
-
-            with click.progressbar(length=len(dest_list),
-                                   label=f'Finding duplicates in {len(source_list) + len(dest_list)} tracks') as bar:
-
-                # start threads
-                for i, part in enumerate(parts):
-                    counter = Value('i', 0)
-                    counters.append(counter)
-                    dest_list_part = list(part)
-                    thread = Process(target=find_duplicates_in_groups_thread, args=(
-                        dest_list_part, groups, compare_tags_def_list, compare_tags_prob_list, counter, results))
-                    threads.append(thread)
-                    thread.daemon = True  # This thread dies when main thread exits
-                    thread.start()
-
-                    # update bar
-                    total = sum([x.value for x in counters])
-                    added = total - bar.pos
-                    if added > 0:
-                        bar.update(added)
-
-                # waiting for complete
-                while not bar.finished:
-                    time.sleep(0.1)
-                    total = sum([x.value for x in counters])
-                    added = total - bar.pos
-                    if added > 0:
-                        bar.update(added)
-
-                # combine results
-                for i in range(len(parts)):
-                    res = results.get()
-                    unique_dest_tracks.extend(res['unique_dest_tracks'])
-                    for i, group in enumerate(res['groups']):
-                        if len(group.def_duplicates) > 0:
-                            groups[i].def_duplicates.extend(group.def_duplicates)
-                            groups[i].def_found_tags.extend(group.def_found_tags)
-                        if len(group.prob_duplicates) > 0:
-                            groups[i].prob_duplicates.extend(group.prob_duplicates)
-                            groups[i].prob_found_tags.extend(group.prob_found_tags)
-
-        except (KeyboardInterrupt, SystemExit):  # aborted by user
-            click.echo()
-            click.echo('Aborted.')
-            sys.exit()
+            for task_matches in run_tasks(find_duplicates_in_source_groups_task, data, len(dest_list), jobs, bar):
+                matches.extend(task_matches)
+    except (KeyboardInterrupt, SystemExit):  # aborted by user
+        click.echo()
+        click.echo('Aborted.')
+        sys.exit()
+
+    # combine results
+
+    matched_dest_indexes = set()
+    for dest_index, group_number, is_def, compare_tags_index in matches:
+        matched_dest_indexes.add(dest_index)
+        group = groups[group_number]
+        dest_tags = dest_list[dest_index]
+        if is_def:
+            group.def_duplicates.append(dest_tags)
+            group.def_found_tags.append(compare_tags_def_list[compare_tags_index])
+        else:
+            group.prob_duplicates.append(dest_tags)
+            group.prob_found_tags.append(compare_tags_prob_list[compare_tags_index])
+
+    for i, dest_tags in enumerate(dest_list):
+        if i not in matched_dest_indexes:
+            unique_dest_tracks.append(dest_tags)
 
     # remove unique source
     unique_source_tracks = []
@@ -948,20 +1567,25 @@ def find_duplicates_in_tag_lists(source_list: list, dest_list: list, compare_tag
     sources_def_dups = []
     sources_prob_dups = []
     if remove_duplicates_in_source:
-        unique_sources = []
+        # sources of groups are already in the index, so it's used again for unique sources
 
-        with click.progressbar(unique_source_tracks,
+        data = (groups_index, unique_source_tracks, compare_tags_def_list, compare_tags_prob_list)
+        source_matches = []
+        with click.progressbar(length=len(unique_source_tracks),
                                label=f'Finding duplicates in {len(unique_source_tracks)} source tracks') as bar:
-            for dest_tags in bar:
-                group, found_tags = find_duplicates_in_groups(dest_tags, groups, compare_tags_def_list)
-                if group is not None:
-                    sources_def_dups.append(dest_tags)
-                else:
-                    group, found_tags = find_duplicates_in_groups(dest_tags, groups, compare_tags_prob_list)
-                    if group is not None:
-                        sources_prob_dups.append(dest_tags)
-                    else:
-                        unique_sources.append(dest_tags)
+            for task_matches in run_tasks(find_duplicates_in_unique_sources_task, data, len(unique_source_tracks),
+                                          jobs, bar):
+                source_matches.extend(task_matches)
+
+        unique_sources = []
+        is_def_dups = dict(source_matches)
+        for i, source_tags in enumerate(unique_source_tracks):
+            if i not in is_def_dups:
+                unique_sources.append(source_tags)
+            elif is_def_dups[i]:
+                sources_def_dups.append(source_tags)
+            else:
+                sources_prob_dups.append(source_tags)
 
         unique_source_tracks = unique_sources
 
@@ -978,57 +1602,205 @@ def find_duplicates_in_tag_lists(source_list: list, dest_list: list, compare_tag
     return groups, unique_source_tracks, unique_dest_tracks, sources_def_dups, sources_prob_dups
 
 
-def find_duplicates_in_groups_thread(dest_list, groups, compare_tags_def_list, compare_tags_prob_list, counter, result):
-    unique_dest_tracks = []
+def find_duplicates_in_source_groups_task(data, positions: range):
+    # returns (dest index, group number, is definitely duplicate, index of found compare tags) for each duplicate
+    groups_index, dest_list, compare_tags_def_list, compare_tags_prob_list = data
+    matches = []
 
-    for i, dest_tags in enumerate(dest_list):
-        group, found_tags = find_duplicates_in_groups(dest_tags, groups, compare_tags_def_list)
-        if group is not None:
-            group.def_duplicates.append(dest_tags)
-            group.def_found_tags.append(found_tags)
-        else:
-            group, found_tags = find_duplicates_in_groups(dest_tags, groups, compare_tags_prob_list)
-            if group is not None:
-                group.prob_duplicates.append(dest_tags)
-                group.prob_found_tags.append(found_tags)
-            else:
-                unique_dest_tracks.append(dest_tags)
-        if (i + 1) % 10 == 0:
-            counter.value += 10
-        if i + 1 == len(dest_list):
-            counter.value += (i % 10) + 1
+    for i in positions:
+        dest_tags = dest_list[i]
+        group_number, found_tags = groups_index.find_duplicates_group_number(dest_tags, compare_tags_def_list)
+        if group_number is not None:
+            matches.append((i, group_number, True, compare_tags_def_list.index(found_tags)))
+            continue
+        group_number, found_tags = groups_index.find_duplicates_group_number(dest_tags, compare_tags_prob_list)
+        if group_number is not None:
+            matches.append((i, group_number, False, compare_tags_prob_list.index(found_tags)))
+
+    return matches
+
+
+def find_duplicates_in_unique_sources_task(data, positions: range):
+    # returns (unique source index, is definitely duplicate) for each unique source which is a duplicate
+    groups_index, unique_source_tracks, compare_tags_def_list, compare_tags_prob_list = data
+    matches = []
+
+    for i in positions:
+        source_tags = unique_source_tracks[i]
+        if groups_index.find_in_duplicates_sources(source_tags, compare_tags_def_list) is not None:
+            matches.append((i, True))
+        elif groups_index.find_in_duplicates_sources(source_tags, compare_tags_prob_list) is not None:
+            matches.append((i, False))
+
+    return matches
+
+
+def get_workers_count(jobs: int = None):
+    if jobs is None or jobs <= 0:
+        jobs = int(settings.SPOTY.get('WORKERS', 0))
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return jobs
+
+
+def run_tasks(task_func, data, count: int, jobs: int = None, bar=None, min_parallel_count: int = None):
+    # runs task_func(data, positions) for all positions from 0 to count and returns results in order.
+    # it runs in worker processes only if the search time measured on some of the tracks is long enough.
+    # if min_parallel_count specified, tasks are not measured (tasks which read files would read them twice,
+    # or the time is already measured), they run in worker processes if count is at least min_parallel_count
+
+    workers_count = get_workers_count(jobs)
+
+    if min_parallel_count is not None:
+        parallel = workers_count > 1 and count >= min_parallel_count
+    else:
+        parallel = workers_count > 1 and is_parallel_faster(task_func, data, count)
+    if parallel:
+        return run_tasks_parallel(task_func, data, count, workers_count, bar)
+
+    results = []
+    for positions in get_tasks_positions(count):
+        results.append(task_func(data, positions))
+        if bar is not None:
+            bar.update(len(positions))
+    return results
 
-    res = {}
-    res['unique_dest_tracks'] = unique_dest_tracks
-    res['groups'] = groups
 
-    result.put(res)
+def iterate_tasks(task_func, data, count: int, jobs: int = None):
+    # the same as run_tasks, but yields positions and results of each task in order, as soon as they are ready
+
+    workers_count = get_workers_count(jobs)
+
+    if workers_count > 1 and is_parallel_faster(task_func, data, count):
+        yield from iterate_tasks_parallel(task_func, data, count, workers_count)
+        return
+
+    for positions in get_tasks_positions(count):
+        yield positions, task_func(data, positions)
+
+
+def is_parallel_faster(task_func, data, count: int):
+    # the time of serial run is estimated by some of the positions
+    if count <= CALIBRATION_TRACKS_COUNT:
+        return False
+    sample = range(0, count, count // CALIBRATION_TRACKS_COUNT)
+    started = time.perf_counter()
+    task_func(data, sample)
+    estimated_time = (time.perf_counter() - started) / len(sample) * count
+    log.debug(f'Estimated serial search time: {estimated_time:.2f} sec ({count} tracks)')
+    return estimated_time > PARALLEL_MIN_SECONDS
+
+
+def get_tasks_positions(count: int):
+    return [range(first, min(first + WORKER_TASK_SIZE, count)) for first in range(0, count, WORKER_TASK_SIZE)]
+
+
+# read only data of worker processes. It is inherited by forked workers, so it is not pickled.
+worker_data = None
+
+
+def init_worker(data):
+    global worker_data
+    worker_data = data
+
+
+def run_worker_task(task):
+    task_func, positions = task
+    return positions.start, len(positions), task_func(worker_data, positions)
+
+
+def start_workers(data, workers_count: int):
+    global worker_data
+
+    if multiprocessing.get_start_method() == 'fork':
+        if threading.active_count() == 1:
+            worker_data = data
+            return Pool(workers_count)
+        # a process forked while other threads are running (see get_tracks_wrapper) can inherit locks held by them,
+        # so workers are started by the fork server and get the data from the initializer
+        context = multiprocessing.get_context('forkserver')
+        return context.Pool(workers_count, initializer=init_worker, initargs=(data,))
+    return Pool(workers_count, initializer=init_worker, initargs=(data,))
+
+
+def stop_workers(pool, finished: bool):
+    global worker_data
+
+    if finished:
+        pool.close()
+    else:
+        pool.terminate()
+    pool.join()
+    worker_data = None
+
+
+def run_tasks_parallel(task_func, data, count: int, workers_count: int, bar=None):
+    tasks = [(task_func, positions) for positions in get_tasks_positions(count)]
+    pool = start_workers(data, workers_count)
+
+    results = []
+    finished = False
+    try:
+        for first, positions_count, result in pool.imap_unordered(run_worker_task, tasks):
+            results.append((first, result))
+            if bar is not None:
+                bar.update(positions_count)
+        finished = True
+    finally:
+        stop_workers(pool, finished)
+
+    results.sort(key=lambda r: r[0])
+    return [result for first, result in results]
+
+
+def iterate_tasks_parallel(task_func, data, count: int, workers_count: int):
+    # workers are stopped if the iteration is stopped before all results are taken
+    tasks = [(task_func, positions) for positions in get_tasks_positions(count)]
+    pool = start_workers(data, workers_count)
+
+    finished = False
+    try:
+        for task, (first, positions_count, result) in zip(tasks, pool.imap(run_worker_task, tasks)):
+            yield task[1], result
+        finished = True
+    finally:
+        stop_workers(pool, finished)
 
 
 def compare_by_tags(source_list: list, dest_list: list, tags_to_compare: list, dest_unique: dict, dest_dups: dict,
                     dup_tag: str, add_dup_tags=False):
     unique = []
     dups = []
+    cache = NormalizedTagsCache()
+
+    source_index = TagsIndex(tags_to_compare, cache)
+    for i, source_tags in enumerate(source_list):
+        source_index.add(source_tags, i)
+
     for dest_tags in dest_list:
-        found = False
-        for source_tags in source_list:
-            if compare_tags(source_tags, dest_tags, tags_to_compare, False):
-                found = True
-                if add_dup_tags:
-                    if dup_tag not in dest_tags:
-                        dest_tags[dup_tag] = ""
-                    dest_tags[dup_tag] += f'{source_tags["SPOTY_DUP_ID"]} : {",".join(tags_to_compare)}\n'
-        if found:
+        found_lines = []
+        for i in sorted(source_index.find(dest_tags)):
+            source_tags = source_list[i]
+            if compare_tags(source_tags, dest_tags, tags_to_compare, False, cache):
+                found_lines.append(f'{source_tags["SPOTY_DUP_ID"]} : {",".join(tags_to_compare)}\n')
+                if not add_dup_tags:
+                    break  # found, lines are not needed
+        if len(found_lines) > 0:
+            if add_dup_tags:
+                dest_tags[dup_tag] = dest_tags.get(dup_tag, "") + ''.join(found_lines)
             dups.append(dest_tags)
         else:
             unique.append(dest_tags)
 
     # move duplicates from unique to dups
+    moved = {}
     for item in dups:
         id = item['SPOTY_DUP_ID']
-        if id in dest_unique:
-            dest_dups[id] = item
-            del dest_unique[id]
+        if id in dest_unique and id not in moved:
+            moved[id] = item
+    dest_dups.update(moved)
+    for id in moved:
+        del dest_unique[id]
 
 
 def move_audio_files_to_path(tags_list, path):
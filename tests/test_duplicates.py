@@ -0,0 +1,145 @@
+from benchmarks.generator import generate_library
+from spoty import settings
+import spoty.utils
+import spoty.duplicates_index
+import pytest
+import threading
+import copy
+
+compare_tags_def_list = list(settings.SPOTY.COMPARE_TAGS_DEFINITELY_DUPLICATE)
+compare_tags_prob_list = list(settings.SPOTY.COMPARE_TAGS_PROBABLY_DUPLICATE)
+compare_tags_list = [tags.split(',') for tags in compare_tags_def_list + compare_tags_prob_list]
+
+
+def make_library(count: int, seed: int):
+    tags_list = generate_library(count, seed, duplicates_rate=0.3)
+    for i, tags in enumerate(tags_list):
+        tags['N'] = i
+    return tags_list
+
+
+def find_pairwise_matches(tags_list: list):
+    # baseline: each track is compared with each previous track
+    matches = []
+    for i, tags in enumerate(tags_list):
+        for j in range(i):
+            for k, tags_to_compare in enumerate(compare_tags_list):
+                if spoty.utils.compare_tags(tags, tags_list[j], tags_to_compare):
+                    matches.append((i, j, k))
+    return matches
+
+
+def get_groups_numbers(groups: list):
+    return [(group.source_tags['N'],
+             [tags['N'] for tags in group.def_duplicates], group.def_found_tags,
+             [tags['N'] for tags in group.prob_duplicates], group.prob_found_tags)
+            for group in groups]
+
+
+def get_matches_pairs(matches: list):
+    return sorted((max(i, j), min(i, j), k) for i, j, k in matches)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_find_tags_matches_equals_pairwise(seed):
+    tags_list = make_library(300, seed)
+    expected = get_matches_pairs(find_pairwise_matches(tags_list))
+
+    assert get_matches_pairs(spoty.utils.find_tags_matches(tags_list, compare_tags_list, jobs=1)) == expected
+
+    # all tracks are checked, each pair must be found once
+    check_indexes = list(range(len(tags_list)))
+    matches = spoty.utils.find_tags_matches(tags_list, compare_tags_list, check_indexes, jobs=1)
+    assert get_matches_pairs(matches) == expected
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_find_duplicates_in_tag_list2_equals_pairwise(seed):
+    tags_list = make_library(300, seed)
+    expected = spoty.utils.make_duplicates_groups_from_matches(
+        tags_list, find_pairwise_matches(tags_list),
+        [tags.split(',') for tags in compare_tags_def_list], [tags.split(',') for tags in compare_tags_prob_list])
+    expected = [group for group in expected if group.has_duplicates()]
+
+    groups, unique_tracks = spoty.utils.find_duplicates_in_tag_list2(tags_list, list(compare_tags_def_list),
+                                                                     list(compare_tags_prob_list), False, 1)
+    assert get_groups_numbers(groups) == get_groups_numbers(expected)
+    assert len(unique_tracks) + sum(group.get_duplicates_count() + 1 for group in groups) == len(tags_list)
+
+
+def test_incremental_index_equals_clusters(tmp_path):
+    index_file_name = str(tmp_path / 'duplicates_index.sqlite')
+    tags_list = make_library(300, 4)
+    for tags in tags_list:
+        tags.pop('SPOTY_FILE_NAME', None)
+        tags['SPOTY_TRACK_ID'] = str(tags['N'])
+
+    for run in range(3):
+        groups, unique_tracks, stats = spoty.duplicates_index.find_duplicates_incremental(
+            copy.deepcopy(tags_list), list(compare_tags_def_list), list(compare_tags_prob_list), index_file_name,
+            jobs=1)
+        expected, expected_unique = spoty.utils.find_duplicates_in_tag_list_clusters(
+            copy.deepcopy(tags_list), list(compare_tags_def_list), list(compare_tags_prob_list), jobs=1)
+        assert get_groups_numbers(groups) == get_groups_numbers(expected)
+        assert [tags['N'] for tags in unique_tracks] == [tags['N'] for tags in expected_unique]
+
+        # the next run compares only changed tracks and forgets removed ones
+        for tags in tags_list[:10]:
+            tags['TITLE'] = tags_list[-1]['TITLE']
+        del tags_list[10:20]
+
+
+def test_remove_exist_tags_by_isrc_and_length_uses_compare_tags_tolerance():
+    exist_tags_list = [{'ISRC': 'A', 'SPOTY_LENGTH': '100'}]
+    new_tags_list = [{'ISRC': 'A', 'SPOTY_LENGTH': str(length)} for length in range(95, 106)]
+
+    new, exist = spoty.utils.remove_exist_tags_by_isrc_and_length(exist_tags_list, new_tags_list)
+
+    expected = [tags for tags in new_tags_list
+                if spoty.utils.compare_tags(tags, exist_tags_list[0], ['ISRC', 'SPOTY_LENGTH'])]
+    assert exist == expected
+    assert len(new) + len(exist) == len(new_tags_list)
+
+
+def test_find_duplicates_in_tag_list2_in_worker_processes(monkeypatch):
+    tags_list = make_library(600, 5)
+    expected, expected_unique = spoty.utils.find_duplicates_in_tag_list2(
+        copy.deepcopy(tags_list), list(compare_tags_def_list), list(compare_tags_prob_list), False, 1)
+
+    # the search is run in worker processes even if it is short
+    monkeypatch.setattr(spoty.utils, 'PARALLEL_MIN_SECONDS', 0)
+    assert spoty.utils.find_tags_matches(tags_list, compare_tags_list, jobs=2, only_parallel=True) is not None
+    groups, unique_tracks = spoty.utils.find_duplicates_in_tag_list2(
+        copy.deepcopy(tags_list), list(compare_tags_def_list), list(compare_tags_prob_list), False, 2)
+
+    assert get_groups_numbers(groups) == get_groups_numbers(expected)
+    assert [tags['N'] for tags in unique_tracks] == [tags['N'] for tags in expected_unique]
+
+
+def test_matches_are_not_kept_for_serial_search(monkeypatch):
+    # tracks with the same title match each other, all pairs would be kept for grouping
+    tags_list = [{'TITLE': 'same', 'SPOTY_LENGTH': '100', 'N': i} for i in range(200)]
+
+    monkeypatch.setattr(spoty.utils, 'PARALLEL_MIN_SECONDS', 1000)
+    assert spoty.utils.find_tags_matches(tags_list, [['TITLE']], jobs=2, only_parallel=True) is None
+    groups, unique_tracks = spoty.utils.find_duplicates_in_tag_list2(tags_list, [], ['TITLE'], False, 2)
+
+    assert len(groups) == 1 and len(groups[0].prob_duplicates) == len(tags_list) - 1
+
+
+def test_find_tags_matches_in_worker_processes_while_threads_are_running(monkeypatch):
+    # spotify and deezer are read in threads while local files are read in worker processes
+    tags_list = make_library(300, 6)
+    expected = get_matches_pairs(spoty.utils.find_tags_matches(tags_list, compare_tags_list, jobs=1))
+
+    monkeypatch.setattr(spoty.utils, 'PARALLEL_MIN_SECONDS', 0)
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        matches = spoty.utils.find_tags_matches(tags_list, compare_tags_list, jobs=2, only_parallel=True)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert get_matches_pairs(matches) == expected
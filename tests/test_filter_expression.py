@@ -0,0 +1,81 @@
+from spoty.filter_expression import FilterExpression, FilterExpressionError
+from spoty.tag_table import TagTable
+import numpy as np
+import pytest
+
+tags_list = [
+    {'ARTIST': 'The Beatles', 'YEAR': '1969', 'GENRE': 'Rock', 'SPOTY_SOURCE': 'LOCAL', 'ISRC': 'A1',
+     'SPOTY_TRACK_ADDED': '2020-05-01 10:00:00'},
+    {'ARTIST': 'Queen', 'YEAR': 1980, 'GENRE': 'rock, pop', 'SPOTY_SOURCE': 'SPOTIFY',
+     'SPOTY_TRACK_ADDED': '2019-05-01 10:00:00'},
+    {'ARTIST': 'X', 'YEAR': 'n/a', 'SPOTY_SOURCE': 'LOCAL', 'ISRC': '12345', 'SPOTY_TRACK_ADDED': 'yesterday'},
+    {'TITLE': 'only title', 'DATE': '2005', 'TRACKNUMBER': '3'},
+]
+
+
+def find(expression: str):
+    table = TagTable(tags_list)
+    return np.flatnonzero(FilterExpression(expression).check(table, np.arange(len(table)))).tolist()
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('SPOTY_SOURCE == LOCAL', [0, 2]),
+    ('spoty_source = "LOCAL" and YEAR < 1970', [0]),
+    ('YEAR >= 1970', [1, 3]),
+    ('not ISRC', [1, 3]),
+    ('ISRC == 12345', [2]),
+    ('ISRC != A1', [2]),
+    ('GENRE contains ROCK or ARTIST matches "^x$"', [0, 1, 2]),
+    ('not (ISRC == A1 or TITLE)', [1, 2]),
+    ('ARTIST == "The Beatles"', [0]),
+    ('SPOTY_TRACK_ADDED > 2020-01-01', [0]),
+    ('SPOTY_TRACK_ADDED < "2020-01-01 00:00:00"', [1]),
+    ('YEAR', [0, 1, 2, 3]),
+    ('TRACK == 3', [3]),
+])
+def test_expression(expression, expected):
+    assert find(expression) == expected
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('YEAR == abc', 'YEAR can be compared only with a number, not "abc".'),
+    ('ARTIST < x', 'ARTIST < "x": only numbers can be compared with "<".'),
+    ('SPOTY_TRACK_ADDED > notadate', 'Cant parse date: "notadate". Use this format: "2018-06-29 08:15:27"'),
+    ('YAER > 2000', 'Unknown tag "YAER".'),
+    ('(ISRC', 'Unexpected end of expression.'),
+    ('ISRC ==', 'Unexpected end of expression.'),
+    ('ISRC ARTIST', 'Unexpected "ARTIST".'),
+    ('== ISRC', 'Tag name expected instead of "==".'),
+    ('ARTIST == "The Beatles', 'Unexpected character at position 11.'),
+])
+def test_expression_errors(expression, message):
+    with pytest.raises(FilterExpressionError) as e:
+        FilterExpression(expression)
+    assert str(e.value) == message
+
+
+def test_invalid_regular_expression():
+    with pytest.raises(FilterExpressionError, match='Invalid regular expression'):
+        FilterExpression('ARTIST matches "("')
+
+
+def test_tags_include_allies():
+    assert FilterExpression('isrc and (genre or not YEAR == 1)').get_tags() == ['ISRC', 'GENRE', 'DATE', 'YEAR']
+
+
+def test_year_of_release_date():
+    # spotify writes the release date to YEAR
+    table = TagTable([{'YEAR': '2019-05-10'}, {'YEAR': '1999-12'}, {'DATE': '2005-03-01'}, {'YEAR': 'unknown'}])
+    mask = FilterExpression('YEAR > 2000').check(table, np.arange(len(table)))
+    assert np.flatnonzero(mask).tolist() == [0, 2]
+    mask = FilterExpression('YEAR == 1999').check(table, np.arange(len(table)))
+    assert np.flatnonzero(mask).tolist() == [1]
+
+
+def test_equality_of_number_values():
+    # deezer reader keeps ids as numbers
+    table = TagTable([{'DEEZER_TRACK_ID': 123}, {'DEEZER_TRACK_ID': '123'}, {'DEEZER_TRACK_ID': 1234}, {}])
+    mask = FilterExpression('DEEZER_TRACK_ID == 123').check(table, np.arange(len(table)))
+    assert np.flatnonzero(mask).tolist() == [0, 1]
+    mask = FilterExpression('DEEZER_TRACK_ID != 123').check(table, np.arange(len(table)))
+    assert np.flatnonzero(mask).tolist() == [2]
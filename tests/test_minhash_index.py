@@ -0,0 +1,27 @@
+from spoty.minhash_index import MinHashIndex
+import pytest
+
+
+def test_similar_tracks_are_found():
+    index = MinHashIndex(0.7)
+    index.add({'ARTIST': 'Daft Punk', 'TITLE': 'Get Lucky (Radio Edit)'}, 0)
+    index.add({'ARTIST': 'Queen', 'TITLE': 'Bohemian Rhapsody'}, 1)
+
+    found = index.find({'ARTIST': 'daft punk', 'TITLE': 'Get Lucky - Radio Edit'})
+    assert [item for similarity, item in found] == [0]
+    assert index.find({'ARTIST': 'Adele', 'TITLE': 'Hello'}) == []
+
+
+def test_tracks_without_text_are_not_similar():
+    index = MinHashIndex(0.7)
+    index.add({'ARTIST': '', 'TITLE': '!!!'}, 0)
+    index.add({'ARTIST': '', 'TITLE': ''}, 1)
+
+    assert index.find({'ARTIST': '', 'TITLE': ''}) == []
+    assert index.find({'ARTIST': '?', 'TITLE': ' '}) == []
+
+
+@pytest.mark.parametrize('threshold', [0, -0.5, 1.01])
+def test_invalid_threshold(threshold):
+    with pytest.raises(ValueError):
+        MinHashIndex(threshold)
@@ -0,0 +1,91 @@
+from benchmarks.generator import generate_library
+from click.testing import CliRunner
+import spoty.cli
+import spoty.csv_playlist
+import spoty.filter_plan
+import spoty.string_pool
+import spoty.utils
+import pytest
+import random
+import copy
+import re
+
+
+@pytest.fixture(scope='module')
+def csv_file_name(tmp_path_factory):
+    file_name = str(tmp_path_factory.mktemp('stream') / 'library.csv')
+    tags_list = generate_library(300, 5, duplicates_rate=0.3)
+    for i, tags in enumerate(tags_list):
+        if i % 3 == 0:
+            tags['SPOTY_TRACK_ADDED'] = f'20{10 + i % 12}-0{1 + i % 9}-15 10:00:00'
+    spoty.csv_playlist.write_tags_to_csv(tags_list, file_name)
+    return file_name
+
+
+def run_cli(args: list):
+    result = CliRunner().invoke(spoty.cli.cli, args)
+    assert result.exception is None, result.output
+    return result.output
+
+
+@pytest.mark.parametrize('commands', [
+    ['count'],
+    ['print'],
+    ['filter', '--rd', 'count'],
+    ['filter', '--ld', 'print'],
+    ['filter', '--where', 'YEAR > 2000 or ARTIST contains a', 'print'],
+    ['filter', '--laa', '2015-01-01', '--got', 'ARTIST,TITLE,SPOTY_TRACK_ADDED', 'print'],
+    ['filter', '--rd', '--where', 'SPOTY_LENGTH < 200', 'count'],
+    ['dup', 'print'],
+])
+def test_stream_output_equals_list_output(csv_file_name, commands):
+    output = run_cli(['get', '--csv', csv_file_name] + commands)
+    stream_output = run_cli(['get', '--csv', csv_file_name, '--stream'] + commands)
+    assert stream_output == output
+
+
+def test_dup_stream_output_equals_list_output(csv_file_name):
+    # the count of groups is not known while they are streamed, so it is not printed in headers
+    output = run_cli(['get', '--csv', csv_file_name, 'dup', 'print'])
+    output = re.sub(r'^Finding duplicates in \d+ tracks\n', '', output, flags=re.MULTILINE)
+    output = re.sub(r'GROUP (\d+)/\d+', r'GROUP \1', output)
+    stream_output = run_cli(['get', '--csv', csv_file_name, 'dup', '--stream', 'print'])
+    assert stream_output == output
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_filter_plan_stream_equals_run(seed):
+    rnd = random.Random(seed)
+    tags_list = generate_library(500, seed, duplicates_rate=0.3)
+
+    def make_plan():
+        plan = spoty.filter_plan.FilterPlan()
+        plan.add(spoty.filter_plan.have_all_tags_filter(['ISRC']))
+        plan.add(spoty.filter_plan.DuplicatesFilter(['ISRC', 'ARTIST,TITLE'], leave=rnd.random() < 0.5))
+        plan.add(spoty.filter_plan.have_no_tags_filter(['DEEZER_TRACK_ID']))
+        return plan
+
+    state = rnd.getstate()
+    expected, expected_summary = make_plan().run(copy.deepcopy(tags_list))
+
+    # parts of random sizes
+    rnd.setstate(state)
+    plan = make_plan()
+    parts = []
+    rest = copy.deepcopy(tags_list)
+    while len(rest) > 0:
+        size = rnd.randint(1, 100)
+        parts.append(rest[:size])
+        rest = rest[size:]
+    summaries = []
+    streamed = [tags for part in plan.stream(parts, summaries.append) for tags in part]
+
+    assert streamed == expected
+    assert summaries == [expected_summary]
+
+
+@pytest.mark.parametrize('stream', [[], ['--stream']])
+def test_string_pool_is_released_after_reading(csv_file_name, stream):
+    output = run_cli(['get', '--csv', csv_file_name] + stream + ['count'])
+    assert re.search(r'\d+ repeated tag values shared', output)
+    assert spoty.string_pool.pool is None